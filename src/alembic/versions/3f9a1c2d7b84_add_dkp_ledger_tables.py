@@ -0,0 +1,78 @@
+"""add dkp ledger tables
+
+Revision ID: 3f9a1c2d7b84
+Revises: c853e6725571
+Create Date: 2026-10-18 09:12:41.302518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7b84'
+down_revision = 'c853e6725571'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dkp_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_guild', sa.String(length=22), nullable=False),
+    sa.Column('id_character', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.Enum('ATTENDANCE', 'LOOT', 'RESET', name='dkpeventtypeenum'), nullable=False),
+    sa.Column('id_attendance', sa.Integer(), nullable=True),
+    sa.Column('id_loot', sa.Integer(), nullable=True),
+    sa.Column('points', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['id_attendance'], ['attendance.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_character'], ['character.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_loot'], ['loot.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('dkp_event_guild_type_index', 'dkp_event', ['id_guild', 'event_type'], unique=False)
+    op.create_index('dkp_event_character_created_at_index', 'dkp_event', ['id_character', 'created_at'], unique=False)
+    op.create_index('dkp_event_attendance_index', 'dkp_event', ['id_attendance'], unique=False)
+    op.create_index('dkp_event_loot_index', 'dkp_event', ['id_loot'], unique=False)
+    op.create_table('dkp_balance',
+    sa.Column('id_character', sa.Integer(), nullable=False),
+    sa.Column('id_guild', sa.String(length=22), nullable=False),
+    sa.Column('raid_points', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['id_character'], ['character.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_character')
+    )
+    op.create_index(op.f('ix_dkp_balance_id_guild'), 'dkp_balance', ['id_guild'], unique=False)
+
+    # backfill ledger from the attendances and loots currently in the dkp system (see DefaultDKPSystem)
+    op.execute("""
+        INSERT INTO dkp_event (id_guild, id_character, event_type, id_attendance, points, created_at)
+        SELECT c.id_guild, a.id_character, 'ATTENDANCE', a.id, CASE WHEN a.is_guild_event THEN 3 ELSE 5 END, COALESCE(a.created_at, NOW())
+        FROM attendance a JOIN character c ON c.id = a.id_character
+        WHERE a.in_dkp
+    """)
+    op.execute("""
+        INSERT INTO dkp_event (id_guild, id_character, event_type, id_loot, points, created_at)
+        SELECT c.id_guild, l.id_character, 'LOOT', l.id, NULL, COALESCE(l.created_at, NOW())
+        FROM loot l JOIN character c ON c.id = l.id_character
+        WHERE l.in_dkp
+    """)
+    op.execute("""
+        INSERT INTO dkp_balance (id_character, id_guild, raid_points, updated_at)
+        SELECT e.id_character, e.id_guild, SUM(e.points), NOW()
+        FROM dkp_event e
+        WHERE e.event_type = 'ATTENDANCE'
+        GROUP BY e.id_character, e.id_guild
+    """)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_dkp_balance_id_guild'), table_name='dkp_balance')
+    op.drop_table('dkp_balance')
+    op.drop_index('dkp_event_loot_index', table_name='dkp_event')
+    op.drop_index('dkp_event_attendance_index', table_name='dkp_event')
+    op.drop_index('dkp_event_character_created_at_index', table_name='dkp_event')
+    op.drop_index('dkp_event_guild_type_index', table_name='dkp_event')
+    op.drop_table('dkp_event')
+    sa.Enum(name='dkpeventtypeenum').drop(op.get_bind(), checkfirst=False)
@@ -0,0 +1,35 @@
+"""add attendance reset index
+
+Revision ID: 5b07f3e9a1d8
+Revises: e81b4d9c2f57
+Create Date: 2026-10-18 12:47:33.108254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b07f3e9a1d8'
+down_revision = 'e81b4d9c2f57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('attendance', sa.Column('reset_index', sa.Integer(), nullable=True))
+    # same as get_reset_index: (raid_datetime - reset_start).days // reset_period
+    attendance = sa.table('attendance', sa.column('id_raid', sa.Integer), sa.column('raid_datetime', sa.DateTime), sa.column('reset_index', sa.Integer))
+    raid = sa.table('raid', sa.column('id', sa.Integer), sa.column('reset_start', sa.DateTime), sa.column('reset_period', sa.Integer))
+    reset_index = sa.func.floor(sa.extract('epoch', attendance.c.raid_datetime - raid.c.reset_start) / (86400 * raid.c.reset_period))
+    op.execute(
+        attendance.update()
+        .where(raid.c.id == attendance.c.id_raid)
+        .values(reset_index=sa.cast(reset_index, sa.Integer))
+    )
+    op.create_index('attendance_character_raid_size_reset_index', 'attendance', ['id_character', 'id_raid', 'raid_size', 'reset_index'], unique=False)
+
+
+def downgrade():
+    op.drop_index('attendance_character_raid_size_reset_index', table_name='attendance')
+    op.drop_column('attendance', 'reset_index')
@@ -0,0 +1,35 @@
+"""add dkp seasons
+
+Revision ID: 7d2e6b0a4c19
+Revises: 3f9a1c2d7b84
+Create Date: 2026-10-18 10:04:17.845210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e6b0a4c19'
+down_revision = '3f9a1c2d7b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dkp_season',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_guild', sa.String(length=22), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('dkp_season_guild_started_at_index', 'dkp_season', ['id_guild', 'started_at'], unique=False)
+    op.add_column('dkp_balance', sa.Column('id_season', sa.Integer(), nullable=True))
+    op.create_foreign_key('dkp_balance_id_season_fkey', 'dkp_balance', 'dkp_season', ['id_season'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.drop_constraint('dkp_balance_id_season_fkey', 'dkp_balance', type_='foreignkey')
+    op.drop_column('dkp_balance', 'id_season')
+    op.drop_index('dkp_season_guild_started_at_index', table_name='dkp_season')
+    op.drop_table('dkp_season')
@@ -0,0 +1,42 @@
+"""add item metadata columns
+
+Revision ID: 9e4f2b8d61a5
+Revises: c3d94a7e0b62
+Create Date: 2026-10-18 14:12:06.904318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4f2b8d61a5'
+down_revision = 'c3d94a7e0b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('item', sa.Column('inventory_type', sa.Integer(), nullable=True))
+    op.add_column('item', sa.Column('item_level', sa.Integer(), nullable=True))
+    op.add_column('item', sa.Column('max_count', sa.Integer(), nullable=True))
+    op.add_column('item', sa.Column('flags', sa.BigInteger(), nullable=True))
+    op.execute("""
+        UPDATE item SET
+            inventory_type = (metadata->>'InventoryType')::integer,
+            item_level = (metadata->>'ItemLevel')::integer,
+            max_count = (metadata->>'maxcount')::integer,
+            flags = (metadata->>'Flags')::bigint
+        WHERE metadata IS NOT NULL
+    """)
+    op.create_index(op.f('ix_item_inventory_type'), 'item', ['inventory_type'], unique=False)
+    op.create_index(op.f('ix_item_item_level'), 'item', ['item_level'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_item_item_level'), table_name='item')
+    op.drop_index(op.f('ix_item_inventory_type'), table_name='item')
+    op.drop_column('item', 'flags')
+    op.drop_column('item', 'max_count')
+    op.drop_column('item', 'item_level')
+    op.drop_column('item', 'inventory_type')
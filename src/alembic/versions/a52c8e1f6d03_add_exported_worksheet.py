@@ -0,0 +1,34 @@
+"""add exported worksheet
+
+Revision ID: a52c8e1f6d03
+Revises: 7d2e6b0a4c19
+Create Date: 2026-10-18 11:21:42.301877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a52c8e1f6d03'
+down_revision = '7d2e6b0a4c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exported_worksheet',
+    sa.Column('id_guild', sa.String(length=22), nullable=False),
+    sa.Column('name', sa.String(length=256), nullable=False),
+    sa.Column('id_gsheet', sa.String(length=256), nullable=False),
+    sa.Column('table_hash', sa.String(length=40), nullable=False),
+    sa.Column('row_hashes', sa.JSON(), nullable=False),
+    sa.Column('n_cols', sa.Integer(), nullable=False),
+    sa.Column('format_rows', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id_guild', 'name')
+    )
+
+
+def downgrade():
+    op.drop_table('exported_worksheet')
@@ -0,0 +1,29 @@
+"""add name trigram indexes
+
+Revision ID: c3d94a7e0b62
+Revises: 5b07f3e9a1d8
+Create Date: 2026-10-18 13:30:51.662419
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d94a7e0b62'
+down_revision = '5b07f3e9a1d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in ['item', 'recipe']:
+        for column in ['name_en', 'name_fr']:
+            op.create_index(f'{table}_{column}_trgm_index', table, [column], unique=False, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ['item', 'recipe']:
+        for column in ['name_en', 'name_fr']:
+            op.drop_index(f'{table}_{column}_trgm_index', table_name=table)
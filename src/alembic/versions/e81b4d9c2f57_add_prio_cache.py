@@ -0,0 +1,30 @@
+"""add prio cache
+
+Revision ID: e81b4d9c2f57
+Revises: a52c8e1f6d03
+Create Date: 2026-10-18 12:02:09.517034
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b4d9c2f57'
+down_revision = 'a52c8e1f6d03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('prio_cache',
+    sa.Column('id_gsheet', sa.String(length=256), nullable=False),
+    sa.Column('revision', sa.String(length=256), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id_gsheet')
+    )
+
+
+def downgrade():
+    op.drop_table('prio_cache')
@@ -5,15 +5,28 @@ import discord
 from discord import InvalidArgument, Option, guild_only, TextChannel, NotFound, Forbidden, HTTPException
 from discord.ext import commands
 from db_util.character import get_character
-from db_util.attendance import fetch_attendances, record_batch_attendance
+from db_util.attendance import fetch_attendances, fetch_guild_attendance_matrix, record_batch_attendance
 from db_util.raid import get_raids
 from db_util.raid_helper import extract_raid_helpers_data
-from ui.attendance import BatchAttendanceRaidSelectView, CharacterAttendanceEmbed, AttendanceRaidSelectView
+from ui.attendance import BatchAttendanceRaidSelectView, CharacterAttendanceEmbed, AttendanceRaidSelectView, GuildAttendanceEmbed
 
 from .util import get_applied_user_id, parse_date, parse_datetime, validate_character_name
 from pycord18n.extension import _ as _t
 
 
+def parse_report_range(date_from: str, date_to: str, default_days: int=30):
+  """Parses a report date range, by default the range ends today and spans `default_days` days"""
+  if date_from is None:
+    date_to = parse_date(date_to, default=datetime.date.today())
+    date_from = date_to - datetime.timedelta(days=default_days)
+  elif date_to is None:
+    date_from = parse_date(date_from)
+    date_to = date_from + datetime.timedelta(days=default_days)
+  else:
+    date_to, date_from = parse_date(date_to), parse_date(date_from)
+  return date_from, date_to
+
+
 class AttendanceCog(commands.Cog):
   attendance_group = discord.SlashCommandGroup("attendance", "Attendance management")
 
@@ -92,14 +105,7 @@ class AttendanceCog(commands.Cog):
       user_id = get_applied_user_id(ctx, for_user, str(ctx.author.id))
       guild_id = str(ctx.guild_id)
 
-      if date_from is None:
-        date_to = parse_date(date_to, default=datetime.date.today())
-        date_from = date_to - datetime.timedelta(days=30)
-      elif date_to is None:
-        date_from = parse_date(date_from)
-        date_to = date_from + datetime.timedelta(days=30)
-      else:
-        date_to, date_from = parse_date(date_to), parse_date(date_from)
+      date_from, date_to = parse_report_range(date_from, date_to)
 
       async with self.bot.db_session_class() as sess:
         async with sess.begin():
@@ -111,6 +117,25 @@ class AttendanceCog(commands.Cog):
     except InvalidArgument as e:
       await ctx.respond(f"Cannot report the attendance: {str(e)}", ephemeral=True)
 
+  @attendance_group.command(description="Summarize the raids attended by all the characters of the guild")
+  @guild_only()
+  async def guild_report(self, ctx,
+    date_from: Option(str, name="from", description="Determine the first raid reset week to consider (format: DD/MM/YYYY). Default: 1 month back.") = None,
+    date_to: Option(str, name="to", description="Determine the last raid reset week to consider (format: DD/MM/YYYY). Default: current reset.") = None,
+    public: Option(bool, description="True: anyone can see the report, False: only the request inititator.") = False
+  ):
+    try:
+      guild_id = str(ctx.guild_id)
+      date_from, date_to = parse_report_range(date_from, date_to)
+
+      async with self.bot.db_session_class() as sess:
+        async with sess.begin():
+          resets, rows = await fetch_guild_attendance_matrix(sess, guild_id, date_from, date_to)
+          embed = GuildAttendanceEmbed(resets, rows, (date_from, date_to))
+          await ctx.respond(embed=embed, ephemeral=not public)
+    except InvalidArgument as e:
+      await ctx.respond(_t("attendance.guild_report.error", error=str(e)), ephemeral=True)
+
 
 def setup(bot):
   bot.add_cog(AttendanceCog(bot))
\ No newline at end of file
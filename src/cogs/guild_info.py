@@ -2,7 +2,7 @@
 from discord import ApplicationContext, Bot, Embed,Interaction, InvalidArgument, Member, Option, Role, SlashCommandGroup, guild_only
 from discord.ext import commands
 from sqlalchemy import update
-from db_util.charter import get_guild_charter
+from db_util.charter import get_guild_charter, update_charter_sign_index
 from models import GuildCharter, GuildCharterField
 
 from ui.guild_info import GuildCharterEmbed
@@ -57,6 +57,7 @@ class GuildInfoCog(commands.Cog):
         charter.id_sign_message = str(response.id)
         sess.add(charter)
         await sess.commit()
+        update_charter_sign_index(charter)
         
   @charter_group.command(description="Edit charter title. Creates the charter if it does not exist.")
   @commands.has_permissions(administrator=True)
@@ -2,7 +2,7 @@ import discord
 from discord.ext import commands
 from pycord18n.extension import _ as _t
 
-from models import GuildSettings
+from db_util.settings import get_guild_settings
 
 
 class HelloCog(commands.Cog): 
@@ -13,7 +13,7 @@ class HelloCog(commands.Cog):
   async def cheer(self, ctx):
     async with ctx.bot.db_session_class() as sess:
       async with sess.begin():
-        settings = await sess.get(GuildSettings, str(ctx.guild.id))
+        settings = await get_guild_settings(sess, str(ctx.guild.id))
         if settings is None or settings.cheer_message is None:
           message = _t("settings.cheer.default")
         else:
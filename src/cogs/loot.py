@@ -8,7 +8,8 @@ import discord
 
 from cogs.util import get_applied_user_id, parse_loots_str, validate_character_name
 from db_util.character import get_character
-from db_util.item import fetch_loots, items_search, register_bulk_loots, remove_loots
+from db_util.item import fetch_loots, items_search, register_bulk_loots, register_loot, remove_loots
+from db_util.name_index import get_item_name_index
 from db_util.wow_data import InventorySlotEnum
 from models import Loot
 from ui.item import ItemListEmbed, LootListEmbed, LootListSelectorView
@@ -16,6 +17,11 @@ from ui.item import ItemListEmbed, LootListEmbed, LootListSelectorView
 from pycord18n.extension import _ as _t
 
 
+async def item_name_autocomplete(ctx: discord.AutocompleteContext):
+  """Suggests items from the in-memory index (no database access), the choices values are the item identifiers"""
+  return [discord.OptionChoice(name[:100], value=str(_id)) for _id, name in get_item_name_index().search(ctx.value or "", limit=25)]
+
+
 class LootCog(commands.Cog):
   def __init__(self, bot):
     self.bot = bot
@@ -24,7 +30,7 @@ class LootCog(commands.Cog):
 
   @loot_group.command(description="Register a loot you have obtained")
   async def register(self, ctx,
-    item_name: str = None,
+    item_name: Option(str, autocomplete=item_name_autocomplete) = None,
     item_id: Option(int, name="id") = None,
     char_name: Option(str, name="character") = None,
     for_user: Option(discord.Member, description="The user the character belongs to. By default, the user is you.") = None
@@ -38,11 +44,16 @@ class LootCog(commands.Cog):
       char_name = validate_character_name(char_name)
       user_id = get_applied_user_id(ctx, for_user, str(ctx.author.id))
       guild_id = str(ctx.guild_id)
+      chosen_id = get_item_name_index().get_choice_identifier(item_name)
 
       async with self.bot.db_session_class() as sess:
         async with sess.begin():
           max_items = 10
           character = await get_character(sess, guild_id, user_id, char_name)
+          if chosen_id is not None:  # picked from the autocompletion, no need to search
+            await register_loot(sess, chosen_id, character.id)
+            await ctx.respond(_t("item.add.success"), ephemeral=True)
+            return
           items = await items_search(sess, item_name, item_id, max_items=max_items + 1)
           item_list_embed = ItemListEmbed(items, max_items=max_items, title=_t("general.ui.list.matching"))
           item_list_selector_view = LootListSelectorView(self.bot, items, character.id, max_items=max_items)
@@ -8,11 +8,25 @@ from pycord18n.extension import _ as _t
 
 from db_util.character import get_character
 from db_util.item import get_character_recipes, get_crafters, get_recipes, items_search, register_user_recipes, remove_user_recipes
+from db_util.name_index import get_recipe_name_index
 from db_util.wow_data import ProfessionEnum
 from models import Recipe
 from ui.item import RecipeCraftersEmbed, RecipeCraftersListSelectorView, RecipeListEmbed, RecipeRegistrationListSelectorView, UserRecipeEmbed
 
 
+async def recipe_name_autocomplete(ctx: discord.AutocompleteContext):
+  """Suggests recipes (of the selected profession, if any) from the in-memory index (no database access), 
+  the choices values are the recipe identifiers"""
+  profession = ctx.options.get("profession")
+  accept = None
+  if profession is not None:
+    accept = lambda recipe_profession: recipe_profession is not None and str(recipe_profession.value) == str(profession)
+  return [
+    discord.OptionChoice(name[:100], value=str(_id)) 
+    for _id, name in get_recipe_name_index().search(ctx.value or "", limit=25, accept=accept)
+  ]
+
+
 class RecipeCog(commands.Cog):
   def __init__(self, bot):
     self.bot = bot
@@ -23,12 +37,15 @@ class RecipeCog(commands.Cog):
   @guild_only()
   async def add(self, ctx, 
     profession: Option(ProfessionEnum, description="Search for a recipe for this profession (ignored if `recipe_ids` is provided).") = None,
-    recipe_name: Option(str, description="A name to look for the recipe (ignored if `recipe_ids` is provided).") = None,
+    recipe_name: Option(str, description="A name to look for the recipe (ignored if `recipe_ids` is provided).", autocomplete=recipe_name_autocomplete) = None,
     recipe_ids: Option(str, name="ids", description="A comma-separated list of recipe spell identifiers.") = None,
     char_name: Option(str, name="character", description="The character who has the recipe. By default, the main character of the user.") = None,
     for_user: Option(discord.Member, description="The user the character belongs to. By default, the user is you.") = None
   ):
     try:
+      chosen_id = get_recipe_name_index().get_choice_identifier(recipe_name)
+      if recipe_ids is None and chosen_id is not None:  # picked from the autocompletion, no need to search
+        recipe_ids = str(chosen_id)
       if (recipe_name is None or profession is None) and recipe_ids is None:
         raise InvalidArgument(_t("recipe.invalid.missinginfo"))
       
@@ -84,13 +101,16 @@ class RecipeCog(commands.Cog):
   @guild_only()
   async def crafters(self, ctx,
     profession: Option(ProfessionEnum, description="Search for a recipe for this profession (ignored if `recipe_ids` is provided).") = None,
-    recipe_name: Option(str, description="A name to look for the recipe (ignored if `recipe_ids` is provided).") = None,
+    recipe_name: Option(str, description="A name to look for the recipe (ignored if `recipe_ids` is provided).", autocomplete=recipe_name_autocomplete) = None,
     recipe_ids: Option(str, name="ids", description="A comma-separated list of recipe spell identifiers.") = None,
     public: Option(bool, description="To show the response publicly") = False,
     show_ids: Option(bool, description="To display recipe identifiers in the response message.") = False
   ):
     try:
       await ctx.defer(ephemeral=not public)
+      chosen_id = get_recipe_name_index().get_choice_identifier(recipe_name)
+      if recipe_ids is None and chosen_id is not None:  # picked from the autocompletion, no need to search
+        recipe_ids = str(chosen_id)
       if recipe_ids is None and (recipe_name is None or profession is None):
         raise InvalidArgument(_t("recipe.invalid.missinginfo"))
 
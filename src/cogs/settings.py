@@ -5,11 +5,13 @@ from pycord18n.extension import _ as _t, I18nExtension
 from cogs.util import parse_datetime
 from db_util.dkp import reset_dkp
 from db_util.raid import get_raids
+from db_util.settings import get_settings_cache_stats, invalidate_guild_settings
 from gsheet.export import export_in_worksheets
-from gsheet_helpers import SheetStateEnum, check_sheet, make_bot_guser_name
+from gsheet_helpers import SheetStateEnum, check_sheet, get_gsheet_timeout, make_bot_guser_name, run_in_gsheet_pool
 from models import GuildSettings
 from ui.gsheet import SheetParserErrorsEmbed
 from ui.raid import OpenAtUpdateRaidSelectView
+from ui.stats import StatsEmbed
 
 
 class SettingsCog(commands.Cog):
@@ -49,6 +51,7 @@ class SettingsCog(commands.Cog):
             sess.add(settings)
           settings.locale = locale
           await sess.commit()
+          invalidate_guild_settings(guild_id)
 
           # update locale
           I18nExtension.default_i18n_instance.set_current_locale(locale)
@@ -81,6 +84,7 @@ class SettingsCog(commands.Cog):
             sess.add(settings)
           settings.cheer_message = message
           await sess.commit()
+          invalidate_guild_settings(guild_id)
 
           await ctx.respond(_t("settings.cheer.update.success"), ephemeral=True)
           
@@ -96,7 +100,8 @@ class SettingsCog(commands.Cog):
     try:
       guild_id = str(ctx.guild.id)
 
-      check_status = check_sheet(identifier)
+      await ctx.defer(ephemeral=True)
+      check_status = await run_in_gsheet_pool(check_sheet, identifier, timeout=get_gsheet_timeout(check=True))
       if check_status == SheetStateEnum.UNKNOWN_SHEET:
         raise InvalidArgument(_t("settings.gsheet.notfound"))
 
@@ -108,6 +113,7 @@ class SettingsCog(commands.Cog):
             sess.add(settings)
           settings.id_export_gsheet = identifier
           await sess.commit()
+          invalidate_guild_settings(guild_id)
           if check_status == SheetStateEnum.OK:
             await ctx.respond(_t("settings.gsheet.identifier.success"), ephemeral=True)
           else:
@@ -173,6 +179,7 @@ class SettingsCog(commands.Cog):
             sess.add(settings)
           settings.id_prio_role = None if role is None else str(role.id)
           await sess.commit()
+          invalidate_guild_settings(guild_id)
 
           # update locale
           await ctx.respond(_t("settings.prio.role.success"), ephemeral=True)
@@ -193,5 +200,12 @@ class SettingsCog(commands.Cog):
     except InvalidArgument as e:
       await ctx.respond(_t("settings.reset_dkp.error", error=str(e)))
 
+  @settings_group.command(description="Display latency and query statistics of the bot commands.")
+  @commands.has_permissions(administrator=True)
+  @guild_only()
+  async def stats(self, ctx):
+    embed = StatsEmbed(ctx.bot.db_pool_metrics, get_settings_cache_stats())
+    await ctx.respond(embed=embed, ephemeral=True)
+
 def setup(bot):
   bot.add_cog(SettingsCog(bot))
\ No newline at end of file
@@ -1,11 +1,14 @@
 import json
 import logging
 import os
+import time
 from dateutil.parser import isoparse
 import pytz
 
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.inspection import inspect
 from alembic.config import Config
 from alembic import command
@@ -23,37 +26,154 @@ def get_db_url(with_async=True):
   return "postgresql+{}://{}:{}@{}:{}/{}".format(driver, username, password, host, port, dbname)
 
 
-async def add_raids(session):
-  from models import Raid
+def get_engine_options():
+  """Connection pool and driver settings of the bot engine, configurable from the environment"""
+  return {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    # 0 disables prepared statements caching (e.g. when connecting through pgbouncer)
+    "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+  }
+
+
+class PoolMetrics(object):
+  """Counters of connection checkouts and of the time spent waiting for a connection"""
+  def __init__(self) -> None:
+    self.checkouts = 0
+    self.failures = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+
+  def record_wait(self, duration: float, success: bool=True):
+    self.checkouts += 1
+    self.failures += int(not success)
+    self.wait_total += duration
+    self.wait_max = max(self.wait_max, duration)
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+  """Connection pool recording checkout wait times"""
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.metrics = PoolMetrics()
+
+  def connect(self):
+    start, success = time.perf_counter(), False
+    try:
+      connection = super().connect()
+      success = True
+      return connection
+    finally:
+      self.metrics.record_wait(time.perf_counter() - start, success=success)
+
+
+def get_pool_metrics(engine):
+  """Current state of the connection pool of an (async) engine"""
+  pool = engine.sync_engine.pool
+  metrics = {
+    "size": pool.size(),
+    "checked_out": pool.checkedout(),
+    "checked_in": pool.checkedin(),
+    "overflow": max(pool.overflow(), 0)
+  }
+  if isinstance(pool, MeteredQueuePool):
+    metrics.update({
+      "checkouts": pool.metrics.checkouts,
+      "checkout_failures": pool.metrics.failures,
+      "wait_avg": pool.metrics.wait_total / max(pool.metrics.checkouts, 1),
+      "wait_max": pool.metrics.wait_max
+    })
+  return metrics
+
+
+SEED_CHUNK_SIZE = 1000  # rows per insert, bounded by the number of query parameters asyncpg accepts
+
+
+async def upsert_rows(session, model, rows, update=True):
+  """Inserts rows (dictionaries mapping column names with values) in the model table with multi-row inserts. 
+  Rows conflicting with existing ones (primary key) are updated if `update` is True, ignored otherwise.
+  """
+  table = model.__table__
+  primary_key = [column.name for column in table.primary_key.columns]
+  for start in range(0, len(rows), SEED_CHUNK_SIZE):
+    chunk = rows[start:start + SEED_CHUNK_SIZE]
+    query = insert(table).values(chunk)
+    if update:
+      query = query.on_conflict_do_update(
+        index_elements=primary_key, 
+        set_={column: query.excluded[column] for column in chunk[0].keys() if column not in primary_key})
+    else:
+      query = query.on_conflict_do_nothing(index_elements=primary_key)
+    await session.execute(query)
+
+
+def read_raid_rows():
   with open("./data/raids.json", "r", encoding="utf-8") as file:
-    raids = [Raid(**{
+    return [{
         k: (isoparse(v).astimezone(pytz.UTC).replace(tzinfo=None) if k == "reset_start" else v) for k, v in raid.items()
-    }) for raid in json.load(file)]
-    logging.getLogger().info("Loading raids into the database.")
-    session.add_all(raids)
-    
+    } for raid in json.load(file)]
 
-async def add_items(session):
+
+def read_item_rows():
   from models import Item
   with open("./data/items.json", "r", encoding="utf-8") as file:
-    items = [Item(**item) for item in json.load(file)]
-    logging.getLogger().info("Loading items into the database.")
-    session.add_all(items)
+    rows = list()
+    for item in json.load(file):
+      metadata = item.get("metadata_")
+      rows.append({
+        "id": item["id"],
+        "name_en": item["name_en"],
+        "name_fr": item["name_fr"],
+        "metadata": metadata,
+        **Item.metadata_columns(metadata or {})
+      })
+    return rows
+
+
+def read_recipe_rows():
+  with open("./data/recipes.json", "r", encoding="utf-8") as file:
+    return [{
+      "id": recipe["id"],
+      "name_en": recipe["name_en"],
+      "name_fr": recipe["name_fr"],
+      "metadata": recipe.get("metadata_"),
+      "profession": ProfessionEnum[recipe["profession"]]
+    } for recipe in json.load(file)]
+
+
+async def add_raids(session):
+  from models import Raid
+  logging.getLogger().info("Loading raids into the database.")
+  await upsert_rows(session, Raid, read_raid_rows(), update=False)
+    
 
+async def add_items(session):
+  from models import Item
+  logging.getLogger().info("Loading items into the database.")
+  await upsert_rows(session, Item, read_item_rows(), update=False)
 
 
 async def add_recipes(session):
   from models import Recipe
-  with open("./data/recipes.json", "r", encoding="utf-8") as file:
-    recipes = list()
-    for recipe in json.load(file):
-        recipe_model = Recipe(**recipe)
-        recipe_model.profession = ProfessionEnum[recipe["profession"]]
-        recipes.append(recipe_model)
-    logging.getLogger().info("Loading recipes into the database.")
-    session.add_all(recipes)
+  logging.getLogger().info("Loading recipes into the database.")
+  await upsert_rows(session, Recipe, read_recipe_rows(), update=False)
 
 
+async def sync_reference_data(session):
+  """Re-syncs the reference data (raids, items and recipes) with the data files: new rows are added and 
+  changed ones are updated in place. Attendance reset indexes are recomputed as raid resets may have changed.
+  """
+  from models import Item, Raid, Recipe
+  from db_util.attendance import update_reset_indexes_query
+  logging.getLogger().info("Syncing reference data with the data files.")
+  await upsert_rows(session, Raid, read_raid_rows())
+  await upsert_rows(session, Item, read_item_rows())
+  await upsert_rows(session, Recipe, read_recipe_rows())
+  await session.execute(update_reset_indexes_query())
+
 
 async def add_charters(session):
   from models import GuildCharter, GuildCharterField
@@ -86,8 +206,15 @@ async def init_db():
         os.makedirs(versions_folder)
 
     from models import Base
-    database_path = get_db_url()
-    engine = create_async_engine(database_path)
+    options = get_engine_options()
+    statement_cache_size = options.pop("statement_cache_size")
+    database_path = get_db_url() + f"?prepared_statement_cache_size={statement_cache_size}"
+    engine = create_async_engine(
+        database_path,
+        poolclass=MeteredQueuePool,
+        connect_args={"statement_cache_size": statement_cache_size},
+        **options
+    )
     db_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
     async with engine.begin() as conn:
@@ -109,6 +236,11 @@ async def init_db():
             logging.getLogger().info("Check for database upgrade.")
             await conn.run_sync(run_alembic_upgrade, alembic_cfg)
 
+    if not is_new_database and os.getenv("SYNC_REFERENCE_DATA", "0") == "1":
+        async with db_session() as sess:
+            async with sess.begin():
+                await sync_reference_data(sess)
+
     return db_session, engine
 
 
@@ -1,10 +1,11 @@
 import pytz
 import datetime
 
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy import select, func
-from models import Attendance, Raid
+from sqlalchemy import Integer, and_, cast, extract, insert, or_, select, func, update
+from models import Attendance, Character, Raid
 from discord import InvalidArgument
+from db_util.dkp import add_attendances_to_ledger, update_attendance_in_ledger
+from db_util.raid import get_raid, get_raids
 from db_util.wow_data import RaidSizeEnum
 
 from pycord18n.extension import _ as _t
@@ -15,13 +16,38 @@ class MultiInvalidArgument(InvalidArgument):
     super().__init__("\n".join([str(e) for e in invalid_arguments]))
 
 
+def get_reset_index(when: datetime.datetime, first_reset_start: datetime.datetime, reset_period: int):
+  """Computes the index of the raid reset a when datetime falls in (0 for the first reset)"""
+  delta = when - first_reset_start
+  return delta.days // reset_period
+
+
+def get_reset_index_sql(when, first_reset_start, reset_period):
+  """SQL expression computing the same reset index as `get_reset_index` from columns"""
+  return cast(func.floor(extract("epoch", when - first_reset_start) / (86400 * reset_period)), Integer)
+
+
+def update_reset_indexes_query():
+  """Update query recomputing the reset index of the attendances, only rows whose reset index is outdated are written 
+  (and their update time is left untouched)"""
+  reset_index = get_reset_index_sql(Attendance.raid_datetime, Raid.reset_start, Raid.reset_period)
+  return update(Attendance).where(
+    Attendance.id_raid == Raid.id,
+    Attendance.reset_index.is_distinct_from(reset_index)
+  ).values(reset_index=reset_index, updated_at=Attendance.updated_at).execution_options(synchronize_session=False)
+
+
+def get_reset_bounds(reset_index: int, first_reset_start: datetime.datetime, first_reset_end: datetime.datetime, reset_period: int):
+  """Computes the start and end datetimes of the raid reset with the given index"""
+  diff = datetime.timedelta(days=reset_index * reset_period)
+  return first_reset_start + diff, first_reset_end + diff
+
+
 def get_reset_for_datetime(when: datetime.datetime, first_reset_start: datetime.datetime, first_reset_end: datetime.datetime, reset_period: int):
   """Computes the start and end datetimes of a raid reset a when datetime falls in, based on the first reset start and end date times and reset period.
   """
-  delta = when - first_reset_start
-  number_of_resets = delta.days // reset_period
-  diff = datetime.timedelta(days=number_of_resets * reset_period)
-  return first_reset_start + diff, first_reset_end + diff
+  reset_index = get_reset_index(when, first_reset_start, reset_period)
+  return get_reset_bounds(reset_index, first_reset_start, first_reset_end, reset_period)
 
 
 async def add_or_update_attendance(sess, 
@@ -32,14 +58,14 @@ async def add_or_update_attendance(sess,
   guild_event=False
 ):
   # check if character has already recorded an attendance
-  this_reset_start, this_reset_end = get_reset_for_datetime(raid_datetime, raid.reset_start, raid.first_reset_end, raid.reset_period)
+  reset_index = get_reset_index(raid_datetime, raid.reset_start, raid.reset_period)
+  this_reset_start, this_reset_end = get_reset_bounds(reset_index, raid.reset_start, raid.first_reset_end, raid.reset_period)
 
   check_query = select(Attendance).where(
     Attendance.id_character == id_character,
     Attendance.id_raid == raid.id,
     Attendance.raid_size == raid_size,
-    Attendance.raid_datetime < this_reset_end,
-    Attendance.raid_datetime >= this_reset_start
+    Attendance.reset_index == reset_index
   )
   check_result = await sess.execute(check_query)
   attendance = check_result.scalars().one_or_none()
@@ -51,17 +77,21 @@ async def add_or_update_attendance(sess,
       is_guild_event=guild_event,
       raid_size=raid_size,
       raid_datetime=raid_datetime,
+      reset_index=reset_index,
       cancelled=False,
       created_at=datetime.datetime.now(tz=pytz.UTC).replace(tzinfo=None)
     )
 
     sess.add(new_attendance)
+    await sess.flush()
+    await add_attendances_to_ledger(sess, [new_attendance])
   else:
     if not guild_event:
       raise InvalidArgument(_t("attendance.invalid.already_locked", reset_start=this_reset_start, reset_end=this_reset_end))
     if guild_event and not attendance.is_guild_event: # update to a guild event if not yet
       attendance.is_guild_event = guild_event
       attendance.raid_datetime = raid_datetime
+      await update_attendance_in_ledger(sess, attendance)
 
 
   
@@ -85,98 +115,194 @@ async def record_attendance(session, id_character: int, raid_datetime: datetime.
   -------
 
   """
-  try:
-    raid = (await session.execute(select(Raid).where(Raid.id == id_raid))).scalars().one()
-    
-    if raid_datetime < raid.open_at:
-      raise InvalidArgument(_t("attendance.invalid.raid_opens_later"))
-
-    await add_or_update_attendance(
-      sess=session, 
-      id_character=id_character, 
-      raid_datetime=raid_datetime,
-      raid=raid,
-      raid_size=raid_size,
-      guild_event=False)
+  raid = await get_raid(session, id_raid)
+  
+  if raid_datetime < raid.open_at:
+    raise InvalidArgument(_t("attendance.invalid.raid_opens_later"))
 
-    if do_commit:
-      await session.commit()
+  await add_or_update_attendance(
+    sess=session, 
+    id_character=id_character, 
+    raid_datetime=raid_datetime,
+    raid=raid,
+    raid_size=raid_size,
+    guild_event=False)
 
-  except NoResultFound as e:
-    raise InvalidArgument(_t("attendance.invalid.unknown_raid"))
+  if do_commit:
+    await session.commit()
 
 
 async def record_batch_attendance(sess, id_characters, raid_datetime: datetime.datetime, raid_size: RaidSizeEnum, id_raid: int, guild_event=True, do_commit=True):
-  """Returns a dictionnary of  
+  """Records the attendances of several characters with one query for the attendances already recorded during 
+  the reset and a single multi-row insert for the new ones. Returns a dictionnary mapping the identifiers of 
+  the characters that could not be added with the corresponding InvalidArgument error.
   """
-  try:
-    raid = (await sess.execute(select(Raid).where(Raid.id == id_raid))).scalars().one()
-    
-    if raid_datetime < raid.open_at:
-      raise InvalidArgument(_t("attendance.invalid.raid_opens_later"))
-
-    not_added = dict()
-    for id_character in id_characters:
-      try: 
-        await add_or_update_attendance(sess, 
-          id_character=id_character, 
-          raid_datetime=raid_datetime, 
-          raid=raid, 
-          raid_size=raid_size, 
-          guild_event=guild_event)
-      except InvalidArgument as e:
-        not_added[id_character] = e        
-    
-    if do_commit:
-      await sess.commit()
-
-    return not_added
-
-  except NoResultFound as e:
-    raise InvalidArgument(_t("attendance.invalid.unknown_raid"))
+  raid = await get_raid(sess, id_raid)
+  
+  if raid_datetime < raid.open_at:
+    raise InvalidArgument(_t("attendance.invalid.raid_opens_later"))
+
+  reset_index = get_reset_index(raid_datetime, raid.reset_start, raid.reset_period)
+  this_reset_start, this_reset_end = get_reset_bounds(reset_index, raid.reset_start, raid.first_reset_end, raid.reset_period)
+
+  # attendances already recorded during this reset
+  existing_query = select(Attendance).where(
+    Attendance.id_character.in_(list(id_characters)),
+    Attendance.id_raid == raid.id,
+    Attendance.raid_size == raid_size,
+    Attendance.reset_index == reset_index
+  )
+  existing_result = await sess.execute(existing_query)
+  existing = {attendance.id_character: attendance for attendance in existing_result.scalars().all()}
+
+  not_added = dict()
+  new_attendances = dict()
+  now = datetime.datetime.now(tz=pytz.UTC).replace(tzinfo=None)
+  for id_character in id_characters:
+    attendance = existing.get(id_character)
+    if attendance is None and id_character not in new_attendances:
+      new_attendances[id_character] = {
+        "id_character": id_character,
+        "id_raid": raid.id,
+        "is_guild_event": guild_event,
+        "raid_size": raid_size,
+        "raid_datetime": raid_datetime,
+        "reset_index": reset_index,
+        "cancelled": False,
+        "in_dkp": True,
+        "created_at": now
+      }
+    elif not guild_event:
+      not_added[id_character] = InvalidArgument(_t("attendance.invalid.already_locked", reset_start=this_reset_start, reset_end=this_reset_end))
+    elif attendance is not None and not attendance.is_guild_event:  # update to a guild event if not yet
+      attendance.is_guild_event = guild_event
+      attendance.raid_datetime = raid_datetime
+      await update_attendance_in_ledger(sess, attendance)
+
+  if len(new_attendances) > 0:
+    insert_query = insert(Attendance).values(list(new_attendances.values())).returning(
+      Attendance.id, Attendance.id_character, Attendance.is_guild_event, Attendance.in_dkp
+    )
+    inserted = (await sess.execute(insert_query)).all()
+    await add_attendances_to_ledger(sess, inserted)
+  
+  if do_commit:
+    await sess.commit()
+
+  return not_added
+
+
+def get_reset_ranges(raids, datetime_from: datetime.datetime, datetime_to: datetime.datetime):
+  """Maps each raid identifier with the (first, last) indexes of its resets overlapping the given datetime range. 
+  Resets before the first one of a raid do not exist: raids whose first reset starts after the range are left out."""
+  reset_ranges = dict()
+  for raid in raids:
+    to_index = get_reset_index(datetime_to, raid.reset_start, raid.reset_period)
+    if to_index < 0:
+      continue
+    reset_ranges[raid.id] = (max(0, get_reset_index(datetime_from, raid.reset_start, raid.reset_period)), to_index)
+  return reset_ranges
+
+
+def in_reset_ranges(reset_ranges: dict):
+  """Where clause selecting the attendances whose reset falls in the given ranges (see `get_reset_ranges`)"""
+  return or_(*[
+    and_(Attendance.id_raid == id_raid, Attendance.reset_index.between(from_index, to_index))
+    for id_raid, (from_index, to_index) in reset_ranges.items()
+  ])
 
 
 async def fetch_attendances(session, id_character: int, date_from: datetime.date, date_to: datetime.date):
-  """
+  """Fetches the attendances of a character in all the raid resets overlapping the given date range. 
+  Returns the attendances and the actual (from, to) datetime range covered by their resets.
   """
 
   datetime_from = datetime.datetime.combine(date_from, datetime.datetime.min.time())
   datetime_to = datetime.datetime.combine(date_to, datetime.datetime.max.time())
+
+  # range of reset indexes per raid
+  raids = await get_raids(session)
+  reset_ranges = get_reset_ranges(raids, datetime_from, datetime_to)
+  if len(reset_ranges) == 0:
+    return [], (datetime_from, datetime_to)
   
-  # reset period is at most 7 days
-  # events not in "from > to" range will be filtered afterwards (as we dont have the reset times info yet)
   query = select(Attendance).where(
     Attendance.id_character == id_character,
-    Attendance.raid_datetime >= (datetime_from - datetime.timedelta(days=7)),
-    Attendance.raid_datetime <= (datetime_to + datetime.timedelta(days=7))
+    in_reset_ranges(reset_ranges)
   )
-
   query_results = await session.execute(query)
+  attendances = query_results.scalars().all()
 
-  # filter events out of the range
-  resets_from_to_cache = dict() # maps (raid id, raid size) with exact (from, to) tuple
-  valid_attendances = list()
-  for attendance in query_results.scalars().all():
-    # update from to cache if needed
-    raid_key = (attendance.id_raid, attendance.raid_size)
-    if raid_key not in resets_from_to_cache:
-      r_start, r_end, r_period =  attendance.raid.reset_start, attendance.raid.first_reset_end, attendance.raid.reset_period
-      from_for_raid, _ = get_reset_for_datetime(datetime_from, r_start, r_end, r_period)
-      _, to_for_raid = get_reset_for_datetime(datetime_to, r_start, r_end, r_period)
-      resets_from_to_cache[raid_key] = (from_for_raid, to_for_raid)
-    
-    # check if current attendance should be considered
-    from_for_raid, to_for_raid = resets_from_to_cache[raid_key]
-    if not (from_for_raid <= attendance.raid_datetime <= to_for_raid):
-      continue
-
-    valid_attendances.append(attendance)
+  resets_from_to = list()
+  for raid in {attendance.raid for attendance in attendances}:
+    from_index, to_index = reset_ranges[raid.id]
+    from_for_raid, _ = get_reset_bounds(from_index, raid.reset_start, raid.first_reset_end, raid.reset_period)
+    _, to_for_raid = get_reset_bounds(to_index, raid.reset_start, raid.first_reset_end, raid.reset_period)
+    resets_from_to.append((from_for_raid, to_for_raid))
 
-  if len(resets_from_to_cache) > 0:
-    actual_datetime_from = min([_from for _from, _ in resets_from_to_cache.values()])
-    actual_datetime_to = max([_to for _, _to in resets_from_to_cache.values()])
+  if len(resets_from_to) > 0:
+    actual_datetime_from = min([_from for _from, _ in resets_from_to])
+    actual_datetime_to = max([_to for _, _to in resets_from_to])
   else:
     actual_datetime_from, actual_datetime_to = datetime_from, datetime_to
 
-  return valid_attendances, (actual_datetime_from, actual_datetime_to)
+  return attendances, (actual_datetime_from, actual_datetime_to)
+
+
+async def fetch_guild_attendance_matrix(sess, guild_id: str, date_from: datetime.date, date_to: datetime.date):
+  """Builds the characters x resets attendance matrix of a guild with a single aggregated query.
+
+  Returns
+  -------
+  resets: list
+    Sorted start datetimes of the raid resets overlapping the date range
+  rows: list
+    One (id_character, name, counts, total) tuple per character who attended at least one raid in the range, where counts 
+    is the list of numbers of attendances per reset (aligned with resets) and total the number of attendances in the range.
+    Sorted by decreasing total.
+  """
+  datetime_from = datetime.datetime.combine(date_from, datetime.datetime.min.time())
+  datetime_to = datetime.datetime.combine(date_to, datetime.datetime.max.time())
+
+  raids = {raid.id: raid for raid in await get_raids(sess)}
+  reset_ranges = get_reset_ranges(raids.values(), datetime_from, datetime_to)
+  if len(reset_ranges) == 0:
+    return [], []
+
+  # all resets (raids sharing the same schedule share their resets)
+  resets = set()
+  for id_raid, (from_index, to_index) in reset_ranges.items():
+    raid = raids[id_raid]
+    for reset_index in range(from_index, to_index + 1):
+      resets.add(get_reset_bounds(reset_index, raid.reset_start, raid.first_reset_end, raid.reset_period)[0])
+  resets = sorted(resets)
+  reset_columns = {reset_start: i for i, reset_start in enumerate(resets)}
+
+  n_attendances = func.count(Attendance.id)
+  query = select(
+    Attendance.id_character, 
+    Character.name,
+    Attendance.id_raid,
+    Attendance.reset_index,
+    n_attendances.label("n_attendances"),
+    func.sum(n_attendances).over(partition_by=Attendance.id_character).label("total")
+  ).join(Character, Character.id == Attendance.id_character).where(
+    Character.id_guild == guild_id,
+    in_reset_ranges(reset_ranges)
+  ).group_by(
+    Attendance.id_character, 
+    Character.name, 
+    Attendance.id_raid, 
+    Attendance.reset_index
+  )
+  results = await sess.execute(query)
+
+  rows = dict()
+  for id_character, name, id_raid, reset_index, count, total in results.all():
+    if id_character not in rows:
+      rows[id_character] = (id_character, name, [0] * len(resets), int(total))
+    raid = raids[id_raid]
+    reset_start, _ = get_reset_bounds(reset_index, raid.reset_start, raid.first_reset_end, raid.reset_period)
+    rows[id_character][2][reset_columns[reset_start]] += count
 
+  return resets, sorted(rows.values(), key=lambda row: (-row[3], row[1]))
@@ -1,3 +1,4 @@
+from collections import defaultdict
 import datetime
 from discord import InvalidArgument
 from sqlalchemy import delete, func, select, update
@@ -200,4 +201,14 @@ async def get_user_characters(sess, id_guild, id_user):
   """get all the user's characters"""
   query = select(Character).where(Character.id_guild == str(id_guild), Character.id_user == str(id_user))
   results = await sess.execute(query)
-  return results.scalars().all()
\ No newline at end of file
+  return results.scalars().all()
+
+
+async def get_users_characters(sess, id_guild, user_ids):
+  """get all the characters of several users with a single query, returns a dictionary mapping user ids (str) with their characters"""
+  query = select(Character).where(Character.id_guild == str(id_guild), Character.id_user.in_([str(id_user) for id_user in user_ids]))
+  results = await sess.execute(query)
+  characters_per_user = defaultdict(list)
+  for character in results.scalars().all():
+    characters_per_user[character.id_user].append(character)
+  return characters_per_user
\ No newline at end of file
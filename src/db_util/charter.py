@@ -1,6 +1,6 @@
 
 
-from discord import InvalidArgument
+from discord import InvalidArgument, PartialEmoji
 from sqlalchemy import select
 from sqlalchemy.exc import NoResultFound
 from pycord18n.extension import _ as _t
@@ -15,4 +15,31 @@ async def get_guild_charter(sess, id_guild: str):
     results = await sess.execute(query)
     return results.unique().scalars().one()
   except NoResultFound as e:
-    raise InvalidArgument(_t("charter.invalid.none"))
\ No newline at end of file
+    raise InvalidArgument(_t("charter.invalid.none"))
+
+_sign_index = dict()  # (id_guild, id_sign_message) => (sign emoji, id_sign_role)
+
+
+def update_charter_sign_index(charter: GuildCharter):
+  """Register the published sign message of a charter, or unregister the guild if not published"""
+  for key in [key for key in _sign_index if key[0] == charter.id_guild]:
+    del _sign_index[key]
+  if charter.id_sign_message is not None and charter.sign_emoji is not None and charter.id_sign_role is not None:
+    _sign_index[(charter.id_guild, charter.id_sign_message)] = (PartialEmoji(name=charter.sign_emoji), charter.id_sign_role)
+
+
+async def load_charter_sign_index(sess):
+  """Builds the charter sign message index from the database"""
+  query = select(GuildCharter).where(GuildCharter.id_sign_message != None)
+  _sign_index.clear()
+  for charter in (await sess.execute(query)).unique().scalars().all():
+    update_charter_sign_index(charter)
+  return len(_sign_index)
+
+
+def get_charter_sign_role(id_guild: str, id_message: str, emoji: PartialEmoji):
+  """Id of the role given for reacting with emoji on message if it is a charter sign message, None otherwise"""
+  sign = _sign_index.get((id_guild, id_message))
+  if sign is None or sign[0] != emoji:
+    return None
+  return sign[1]
\ No newline at end of file
@@ -1,9 +1,10 @@
 from abc import abstractmethod
+from collections import defaultdict
 from db_util.priorities import PrioTierEnum
-from models import Attendance, Character, Raid, Loot
-from db_util.wow_data import RaidSizeEnum
-from sqlalchemy import select, update
-from sqlalchemy.util import immutabledict
+from models import Attendance, Character, DkpBalance, DkpEvent, DkpSeason, Raid, Loot, utcnow
+from db_util.wow_data import DkpEventTypeEnum, RaidSizeEnum
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
 
 
 class AbstrackDKPSystem(object):
@@ -34,39 +35,242 @@ class DefaultDKPSystem(AbstrackDKPSystem):
       return 5
 
 
-async def compute_dkp_score(sess, character: Character, priorities: dict, dkp_system: AbstrackDKPSystem=None):
+async def get_character_guilds(sess, character_ids):
+  """Maps the given character identifiers with their guild identifier"""
+  query = select(Character.id, Character.id_guild).where(Character.id.in_(set(character_ids)))
+  results = await sess.execute(query)
+  return {id_character: id_guild for id_character, id_guild in results.all()}
+
+
+async def get_dkp_seasons(sess, guild_id: str):
+  """Returns the DKP seasons of a guild, oldest first"""
+  query = select(DkpSeason).where(DkpSeason.id_guild == guild_id).order_by(DkpSeason.started_at)
+  results = await sess.execute(query)
+  return results.scalars().all()
+
+
+async def get_current_dkp_season(sess, guild_id: str):
+  """Returns the current DKP season of a guild, None if DKP were never reset"""
+  query = select(DkpSeason).where(DkpSeason.id_guild == guild_id).order_by(DkpSeason.started_at.desc()).limit(1)
+  results = await sess.execute(query)
+  return results.scalars().one_or_none()
+
+
+async def _add_to_balances(sess, guild_per_character: dict, points_per_character: dict):
+  """Adds points to the DKP balances of the characters for the current season of their guild, 
+  creating the balances if needed. Balances from a past season are restarted from zero.
+  """
+  if len(points_per_character) == 0:
+    return
+  season_per_guild = dict()
+  for id_guild in {guild_per_character[id_character] for id_character in points_per_character.keys()}:
+    season = await get_current_dkp_season(sess, id_guild)
+    season_per_guild[id_guild] = None if season is None else season.id
+
+  now = utcnow()
+  query = insert(DkpBalance).values([{
+      "id_character": id_character, 
+      "id_guild": guild_per_character[id_character], 
+      "id_season": season_per_guild[guild_per_character[id_character]], 
+      "raid_points": points, 
+      "updated_at": now
+    } for id_character, points in points_per_character.items()
+  ])
+  same_season = DkpBalance.id_season.is_not_distinct_from(query.excluded.id_season)
+  query = query.on_conflict_do_update(
+    index_elements=[DkpBalance.id_character],
+    set_={
+      "raid_points": case((same_season, DkpBalance.raid_points + query.excluded.raid_points), else_=query.excluded.raid_points), 
+      "id_season": query.excluded.id_season,
+      "updated_at": query.excluded.updated_at
+    }
+  )
+  await sess.execute(query)
+
+
+async def add_attendances_to_ledger(sess, attendances, dkp_system: AbstrackDKPSystem=None):
+  """Records the DKP events of newly created attendances and updates the balances of their characters.
+  The attendances must have been flushed (i.e. have an identifier).
+  """
   if dkp_system is None:
     dkp_system = DefaultDKPSystem()
-  
-  # add from loots
-  dkp_loots_query = select(Loot).where(Loot.id_character == character.id, Loot.in_dkp == True)
-  dkp_loots_results = await sess.execute(dkp_loots_query)
-  dkp_loots = dkp_loots_results.scalars().all()
+  attendances = [attendance for attendance in attendances if attendance.in_dkp]
+  if len(attendances) == 0:
+    return
+
+  guilds = await get_character_guilds(sess, [attendance.id_character for attendance in attendances])
+  events = list()
+  points_per_character = defaultdict(int)
+  now = utcnow()
+  for attendance in attendances:
+    points = dkp_system.get_raid_points(attendance)
+    points_per_character[attendance.id_character] += points
+    events.append({
+      "id_guild": guilds[attendance.id_character],
+      "id_character": attendance.id_character,
+      "event_type": DkpEventTypeEnum.ATTENDANCE,
+      "id_attendance": attendance.id,
+      "points": points,
+      "created_at": now
+    })
+
+  await sess.execute(insert(DkpEvent).values(events))
+  await _add_to_balances(sess, guilds, points_per_character)
+
+
+async def update_attendance_in_ledger(sess, attendance: Attendance, dkp_system: AbstrackDKPSystem=None):
+  """Re-evaluates the points of an updated attendance and updates the balance of its character accordingly"""
+  if dkp_system is None:
+    dkp_system = DefaultDKPSystem()
+  if not attendance.in_dkp:
+    return
+
+  query = select(DkpEvent).where(DkpEvent.id_attendance == attendance.id)
+  result = await sess.execute(query)
+  event = result.scalars().one_or_none()
+  if event is None:
+    return
+  season = await get_current_dkp_season(sess, event.id_guild)
+  if season is not None and event.created_at < season.started_at:
+    return  # past seasons are not updated
+
+  points = dkp_system.get_raid_points(attendance)
+  delta = points - event.points
+  if delta == 0:
+    return
+  event.points = points
+  await _add_to_balances(sess, {event.id_character: event.id_guild}, {event.id_character: delta})
+
 
-  character_role = (character.character_class, character.role, character.spec) 
+async def add_loots_to_ledger(sess, loots):
+  """Records the DKP events of newly created loots (must have been flushed). 
+  Loots do not have points in the ledger as their cost depends on the item priorities.
+  """
+  loots = [loot for loot in loots if loot.in_dkp]
+  if len(loots) == 0:
+    return
+  guilds = await get_character_guilds(sess, [loot.id_character for loot in loots])
+  now = utcnow()
+  await sess.execute(insert(DkpEvent).values([{
+      "id_guild": guilds[loot.id_character],
+      "id_character": loot.id_character,
+      "event_type": DkpEventTypeEnum.LOOT,
+      "id_loot": loot.id,
+      "points": None,
+      "created_at": now
+    } for loot in loots
+  ]))
+
+
+async def remove_loots_from_ledger(sess, loot_ids):
+  if len(loot_ids) == 0:
+    return
+  await sess.execute(delete(DkpEvent).where(DkpEvent.id_loot.in_(loot_ids)))
+
+
+async def get_dkp_history(sess, id_character: int):
+  """Returns the DKP events of a character, oldest first"""
+  query = select(DkpEvent).where(DkpEvent.id_character == id_character).order_by(DkpEvent.created_at, DkpEvent.id)
+  results = await sess.execute(query)
+  return results.scalars().all()
+
+
+async def _get_season_range(sess, guild_id: str, season: DkpSeason):
+  """Returns the (start, end) datetimes of a season, end is None for the current season"""
+  query = select(func.min(DkpSeason.started_at)).where(DkpSeason.id_guild == guild_id, DkpSeason.started_at > season.started_at)
+  result = await sess.execute(query)
+  return season.started_at, result.scalar()
+
+
+async def compute_guild_dkp_scores(sess, guild_id: str, priorities: dict, dkp_system: AbstrackDKPSystem=None, character_ids: list=None, season: DkpSeason=None):
+  """Computes the DKP scores of the characters of a guild from the DKP ledger.
+
+  Parameters
+  ----------
+  sess: AsyncSession
+  guild_id: str
+    Guild identifier
+  priorities: Mapping[int,ItemWithPriority]
+    Item priorities (loots for items without priority do not count)
+  dkp_system: AbstrackDKPSystem
+    The DKP system used for evaluating loots, default one if None. Raid points are evaluated when 
+    the attendances are registered.
+  character_ids: list
+    Restrict the computation to these characters (optional)
+  season: DkpSeason
+    The season to compute the scores for, None for the current one. 
+
+  Returns
+  -------
+  scores: dict
+    Maps character identifiers with their DKP score, characters without DKP events are omitted.
+  """
+  if dkp_system is None:
+    dkp_system = DefaultDKPSystem()
+
+  current_season = await get_current_dkp_season(sess, guild_id)
+  if season is None or (current_season is not None and season.id == current_season.id):
+    season = current_season
+    season_start, season_end = (None, None) if season is None else (season.started_at, None)
+  else:
+    season_start, season_end = await _get_season_range(sess, guild_id, season)
+
+  def _event_where_clause(*event_types):
+    where_clause = [DkpEvent.id_guild == guild_id, DkpEvent.event_type.in_(event_types)]
+    if character_ids is not None:
+      where_clause.append(DkpEvent.id_character.in_(character_ids))
+    if season_start is not None:
+      where_clause.append(DkpEvent.created_at >= season_start)
+    if season_end is not None:
+      where_clause.append(DkpEvent.created_at < season_end)
+    return where_clause
+
+  scores = defaultdict(int)
+
+  # add from attendances: balances for current season, ledger for past ones
+  if season_end is None:
+    balance_where_clause = [DkpBalance.id_guild == guild_id, DkpBalance.id_season.is_not_distinct_from(None if season is None else season.id)]
+    if character_ids is not None:
+      balance_where_clause.append(DkpBalance.id_character.in_(character_ids))
+    raid_points_query = select(DkpBalance.id_character, DkpBalance.raid_points).where(*balance_where_clause)
+  else:
+    raid_points_query = select(DkpEvent.id_character, func.sum(DkpEvent.points)) \
+      .where(*_event_where_clause(DkpEventTypeEnum.ATTENDANCE, DkpEventTypeEnum.RESET)) \
+      .group_by(DkpEvent.id_character)
+  raid_points_results = await sess.execute(raid_points_query)
+
+  for id_character, raid_points in raid_points_results.all():
+    scores[id_character] += raid_points
+
+  # add from loots, one row per (character, item)
+  # loots not in dkp anymore were reset before dkp seasons existed
+  role_columns = [Character.character_class, Character.role, Character.spec]
+  dkp_loots_query = select(DkpEvent.id_character, Loot.id_item, *role_columns, func.count(DkpEvent.id)) \
+    .join(Loot, DkpEvent.id_loot == Loot.id) \
+    .join(Character, DkpEvent.id_character == Character.id) \
+    .where(Loot.in_dkp == True, *_event_where_clause(DkpEventTypeEnum.LOOT)) \
+    .group_by(DkpEvent.id_character, Loot.id_item, *role_columns)
+  dkp_loots_results = await sess.execute(dkp_loots_query)
 
-  dkp = 0
-  for loot in dkp_loots:
-    if loot.id_item not in priorities:
-      continue 
-    priority_list = priorities[loot.id_item].priority_list
-    tier = priority_list.get_priority_tier(character_role)
-    dkp += dkp_system.get_loot_points(loot, tier)
+  for id_character, id_item, character_class, role, spec, count in dkp_loots_results.all():
+    if id_item not in priorities:
+      continue
+    priority_list = priorities[id_item].priority_list
+    tier = priority_list.get_priority_tier((character_class, role, spec))
+    loot = Loot(id_character=id_character, id_item=id_item, in_dkp=True)
+    scores[id_character] += count * dkp_system.get_loot_points(loot, tier)
 
-  # add from attendance
-  dkp_attendances_query = select(Attendance).where(Attendance.id_character == character.id, Attendance.in_dkp == True)
-  dkp_attendances_results = await sess.execute(dkp_attendances_query)
-  dkp_attendances = dkp_attendances_results.scalars().all()
+  return dict(scores)
 
-  for attendance in dkp_attendances:
-    dkp += dkp_system.get_raid_points(attendance)
 
-  return dkp
+async def compute_dkp_score(sess, character: Character, priorities: dict, dkp_system: AbstrackDKPSystem=None, season: DkpSeason=None):
+  scores = await compute_guild_dkp_scores(sess, character.id_guild, priorities, dkp_system=dkp_system, character_ids=[character.id], season=season)
+  return scores.get(character.id, 0)
 
-async def reset_dkp(sess, guild_id: int):
-  character_select = select(Character.id).where(Character.id_guild == guild_id)
-  update_attendances = update(Attendance).where(Attendance.id_character.in_(character_select)).values(in_dkp=False)
-  update_loots = update(Loot).where(Loot.id_character.in_(character_select)).values(in_dkp=False)
 
-  await sess.execute(update_attendances, execution_options=immutabledict({"synchronize_session": 'fetch'}))
-  await sess.execute(update_loots, execution_options=immutabledict({"synchronize_session": 'fetch'}))
\ No newline at end of file
+async def reset_dkp(sess, guild_id: str):
+  """Starts a new DKP season for the guild, previous events are kept for history"""
+  season = DkpSeason(id_guild=guild_id, started_at=utcnow())
+  sess.add(season)
+  await sess.flush()
+  return season
@@ -1,10 +1,11 @@
 from collections import defaultdict
 
 from discord import InvalidArgument
-from sqlalchemy import or_, select, Integer, delete, func, not_
+from sqlalchemy import insert, literal, or_, select, delete, func, not_
 from db_util.character import get_character
+from db_util.dkp import add_loots_to_ledger, remove_loots_from_ledger
 from db_util.wow_data import InventorySlotEnum
-from models import Character, Item, Loot, Recipe, UserRecipe
+from models import Character, Item, Loot, Recipe, UserRecipe, utcnow
 
 from sqlalchemy.exc import NoResultFound, IntegrityError, MultipleResultsFound
 
@@ -12,15 +13,24 @@ from pycord18n.extension import _ as _t
 
 
 def strcmp_sql_fn(field, query, exact=True):
+  """Substring match (exact) or trigram word similarity match (loose), both are served by the trigram indexes of the name fields"""
   if exact:
     return field.ilike(f"%{query}%")
   else:
-    t_query = "%".join([c for c in query])
-    return field.ilike(f"%{t_query}%")
+    return literal(query).op("<%")(field)
+
+
+def relevance_sql_fn(fields, query, exact=True):
+  """Relevance of a name match: best (word) similarity between the query and the name fields"""
+  if exact:
+    return func.greatest(*[func.similarity(f, query) for f in fields])
+  else:
+    return func.greatest(*[func.word_similarity(query, f) for f in fields])
 
 
 async def items_search(sess, name: str=None, _id: int=None, max_items: int=-1, model_class=Item, filters=None):
-  """At least name or id should be provided, otherwise invalid argument error is raised"""
+  """At least name or id should be provided, otherwise invalid argument error is raised. 
+  Items matching the name are sorted by decreasing relevance."""
   try:
     if _id is not None:
       id_query = select(model_class).where(model_class.id == _id)
@@ -30,32 +40,21 @@ async def items_search(sess, name: str=None, _id: int=None, max_items: int=-1, m
     if name is None:
       raise InvalidArgument(_t("item.invalid.missing.nameorid"))
  
-    # attempt exact match 
+    # attempt exact match, then loose match
     name_fields = [model_class.name_en, model_class.name_fr]
-    exact_where_clause = [or_(*[strcmp_sql_fn(f, name) for f in name_fields])]
-    if filters is not None and len(filters) > 0:
-      exact_where_clause.extend(filters)
-    exact_match_query = select(model_class).where(*exact_where_clause).order_by(model_class.id)
-    if max_items > 0:
-      exact_match_query = exact_match_query.limit(max_items)
-    exact_results = await sess.execute(exact_match_query)
-    exact_items = exact_results.scalars().all()
-
-    if len(exact_items) > 0:
-      return exact_items
-
-    # no exact match 
-    loose_where_clause = [or_(*[strcmp_sql_fn(f, name, exact=False) for f in name_fields])]
-    if filters is not None and len(filters) > 0:
-      loose_where_clause.extend(filters)
-    loose_match_query = select(model_class).where(*loose_where_clause).order_by(model_class.id)
-    if max_items > 0:
-      loose_match_query = loose_match_query.limit(max_items)
-    loose_results = await sess.execute(loose_match_query)
-    loose_items = loose_results.scalars().all()
-    
-    if len(loose_items) > 0:
-      return loose_items
+    for exact in [True, False]:
+      where_clause = [or_(*[strcmp_sql_fn(f, name, exact=exact) for f in name_fields])]
+      if filters is not None and len(filters) > 0:
+        where_clause.extend(filters)
+      relevance = relevance_sql_fn(name_fields, name, exact=exact)
+      match_query = select(model_class).where(*where_clause).order_by(relevance.desc(), model_class.id)
+      if max_items > 0:
+        match_query = match_query.limit(max_items)
+      results = await sess.execute(match_query)
+      items = results.scalars().all()
+
+      if len(items) > 0:
+        return items
     
     raise InvalidArgument(_t("item.invalid.nomatch"))
   except NoResultFound as e:
@@ -68,15 +67,17 @@ async def register_loot(sess, item_id, character_id, in_dkp=False, commit=True):
     item = await sess.get(Item, item_id)
     if item is None:
       raise InvalidArgument(_t("item.invalid.notfoundwithid", id_item=item_id))
-    maxcount = int(item.metadata_["maxcount"])
+    maxcount = item.max_count
 
     cnt_query = select(func.count(Loot.id)).where(Loot.id_item == item_id, Loot.id_character == character_id)
     cnt_res = await sess.execute(cnt_query)
     loot_count = cnt_res.scalar()
    
-    if maxcount == 0 or loot_count < maxcount:
+    if not maxcount or loot_count < maxcount:  # NULL or 0 means unlimited
       new_loot = Loot(id_item=item_id, id_character=character_id, in_dkp=in_dkp)
       sess.add(new_loot)
+      await sess.flush()
+      await add_loots_to_ledger(sess, [new_loot])
     else:
       raise InvalidArgument(_t("loot.invalid.toomany", count=maxcount))
 
@@ -87,25 +88,57 @@ async def register_loot(sess, item_id, character_id, in_dkp=False, commit=True):
 
 
 async def register_bulk_loots(sess, guild_id, loots_maps: dict, in_dkp=False):
-  """"""
+  """Registers loots for several characters (mapping character names with lists of item identifiers) with 
+  a constant number of queries. Raises an InvalidArgument for the first invalid character or loot, in which 
+  case nothing is registered.
+  """
+  if len(loots_maps) == 0:
+    return
+  item_ids = {item_id for ids in loots_maps.values() for item_id in ids}
+
+  # characters
+  char_result = await sess.execute(select(Character).where(Character.name.in_(list(loots_maps.keys())), Character.id_guild == guild_id))
+  characters_per_name = defaultdict(list)
+  for character in char_result.scalars().all():
+    characters_per_name[character.name].append(character)
+
+  # items
+  items_result = await sess.execute(select(Item).where(Item.id.in_(list(item_ids))))
+  items = {item.id: item for item in items_result.scalars().all()}
+
+  # already recorded loots
+  character_ids = [character.id for characters in characters_per_name.values() for character in characters]
+  count_query = select(Loot.id_character, Loot.id_item, func.count(Loot.id)).where(
+    Loot.id_character.in_(character_ids),
+    Loot.id_item.in_(list(item_ids))
+  ).group_by(Loot.id_character, Loot.id_item)
+  loot_counts = defaultdict(int)
+  for id_character, id_item, count in (await sess.execute(count_query)).all():
+    loot_counts[(id_character, id_item)] = count
+
+  new_loots = list()
+  now = utcnow()
   for character_name, item_ids in loots_maps.items():
-    # extract character
-    try:
-      char_result = await sess.execute(select(Character).where(Character.name == character_name, Character.id_guild == guild_id))
-      character = char_result.scalars().one()
-    except NoResultFound:
+    characters = characters_per_name[character_name]
+    if len(characters) == 0:
       raise InvalidArgument(_t("loot.invalid.nocharacter", character_name=character_name))
-    except MultipleResultsFound:
+    elif len(characters) > 1:
       raise InvalidArgument(_t("loot.invalid.multiplecharacters", character_name=character_name))
+    character = characters[0]
 
     for item_id in item_ids:
-      try:
-        await register_loot(sess, item_id, character.id, in_dkp=in_dkp, commit=False)
-      except InvalidArgument as e:
-        # TODO make underlying error detection cleaner
-        if str(e) == _t("item.invalid.notfoundwithid", id_item=item_id):
-          raise e
+      item = items.get(item_id)
+      if item is None:
+        raise InvalidArgument(_t("item.invalid.notfoundwithid", id_item=item_id))
+      if item.max_count and loot_counts[(character.id, item_id)] >= item.max_count:  # 0 means unlimited
         raise InvalidArgument(_t("item.invalid.alreadyrecorded_withinfo", item_id=item_id, character_name=character_name))
+      loot_counts[(character.id, item_id)] += 1
+      new_loots.append({"id_character": character.id, "id_item": item_id, "in_dkp": in_dkp, "created_at": now})
+
+  if len(new_loots) > 0:
+    insert_query = insert(Loot).values(new_loots).returning(Loot.id, Loot.id_character, Loot.in_dkp)
+    inserted = (await sess.execute(insert_query)).all()
+    await add_loots_to_ledger(sess, inserted)
 
   await sess.commit()
 
@@ -142,7 +175,7 @@ async def fetch_loots(sess, character_id: int, slot: InventorySlotEnum=None, max
   if slot is not None:
     inventory_types = [e.value for e in slot.get_inventory_types()]
     if len(inventory_types) > 0:
-      where_clause.append(Loot.item.has(Item.metadata_['InventoryType'].astext.cast(Integer).in_(inventory_types)))
+      where_clause.append(Loot.item.has(Item.inventory_type.in_(inventory_types)))
   
   # limit number of results
   if max_items > 0:
@@ -168,6 +201,7 @@ async def remove_loots(sess, character_id: int, item_id: int, only_last=True, fo
   results = await sess.execute(query)
   loots = results.scalars().all()
 
+  await remove_loots_from_ledger(sess, [loot.id for loot in loots])
   for loot in loots:
     await sess.delete(loot)
   
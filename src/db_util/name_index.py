@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from sqlalchemy import select
+from models import Item, Recipe
+
+
+def normalize_name(name: str) -> str:
+  """Lower case name without accents"""
+  decomposed = unicodedata.normalize("NFKD", name)
+  return "".join([c for c in decomposed if not unicodedata.combining(c)]).lower().strip()
+
+
+def trigrams(text: str):
+  return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+class NameIndex(object):
+  """In-memory index of (localized) names for autocompletion. Queries are first matched against the 
+  beginning of the words of the names (using the positions of the words, sorted by the name suffixes starting 
+  at them), then as substrings anywhere in the names (using a trigram inverted index) and finally by trigram 
+  similarity when nothing contains the query.
+  """
+  MIN_NGRAM_QUERY = 3
+  MAX_PREFIX_SCAN = 1000
+
+  def __init__(self) -> None:
+    self._entries = list()  # (identifier, name, normalized name, payload)
+    self._identifiers = set()
+    self._trigrams = defaultdict(set)  # trigram => entry indexes (sorted array once frozen)
+    self._entry_trigrams = array("H")  # entry index => number of trigrams
+    self._words = list()  # (entry index, position of a word in the normalized name)
+    self._word_entries = array("L")  # once frozen, entry indexes and positions of the words, 
+    self._word_positions = array("H")  # sorted by the name suffixes starting at the words
+
+  def add(self, identifier, names, payload=None):
+    """Indexes the names (e.g. in different locales) of an object"""
+    for name in set([name for name in names if name is not None and len(name.strip()) > 0]):
+      normalized = normalize_name(name)
+      entry_index = len(self._entries)
+      self._entries.append((identifier, name, normalized, payload))
+      self._identifiers.add(identifier)
+      entry_trigrams = trigrams(normalized)
+      for trigram in entry_trigrams:
+        self._trigrams[trigram].add(entry_index)
+      self._entry_trigrams.append(len(entry_trigrams))
+      for position, c in enumerate(normalized):
+        if c != " " and (position == 0 or normalized[position - 1] == " "):
+          self._words.append((entry_index, position))
+    return self
+
+  def freeze(self):
+    """Must be called once all the names have been added, no names can be added afterwards"""
+    self._words.sort(key=lambda word: self._entries[word[0]][2][word[1]:])
+    self._word_entries = array("L", [entry_index for entry_index, _ in self._words])
+    self._word_positions = array("H", [position for _, position in self._words])
+    self._words = list()
+    self._trigrams = {trigram: array("L", sorted(entry_indexes)) for trigram, entry_indexes in self._trigrams.items()}
+    return self
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get_choice_identifier(self, value: str):
+    """Identifier of the object picked from the autocompletion choices (whose values are the identifiers), 
+    None if the value was typed freely"""
+    if value is None or not value.isdigit() or int(value) not in self._identifiers:
+      return None
+    return int(value)
+
+  def _word_prefix_candidates(self, query: str):
+    """Entries having a word starting with the query, at most MAX_PREFIX_SCAN (the first ones in the lexicographic order 
+    of the name suffixes starting at the matching words)"""
+    word_prefix = lambda i: self._entries[self._word_entries[i]][2][self._word_positions[i]:self._word_positions[i] + len(query)]
+    words = range(len(self._word_entries))
+    start = bisect_left(words, query, key=word_prefix)
+    end = bisect_right(words, query, lo=start, hi=min(len(words), start + self.MAX_PREFIX_SCAN), key=word_prefix)
+    return self._word_entries[start:end]
+
+  def _substring_candidates(self, query: str):
+    postings = sorted([self._trigrams.get(trigram, ()) for trigram in trigrams(query)], key=len)
+    if len(postings) == 0:
+      return []
+    # entries containing the query have all its trigrams, filtering the smallest postings list is enough
+    return [i for i in postings[0] if query in self._entries[i][2]]
+
+  def _fuzzy_candidates(self, query: str):
+    query_trigrams = trigrams(query)
+    overlaps = Counter()
+    for trigram in query_trigrams:
+      overlaps.update(self._trigrams.get(trigram, ()))
+    scores = {
+      i: overlap / (len(query_trigrams) + self._entry_trigrams[i] - overlap) 
+      for i, overlap in overlaps.items()
+    }
+    return sorted(scores.keys(), key=lambda i: -scores[i])
+
+  def _rank(self, query: str, candidates, n: int):
+    """Names starting with the query first, then the shortest names"""
+    def rank(i):
+      normalized = self._entries[i][2]
+      return (not normalized.startswith(query), len(normalized), normalized)
+    return heapq.nsmallest(n, set(candidates), key=rank)
+
+  def _collect(self, candidates, results: dict, limit: int, accept=None):
+    for i in candidates:
+      identifier, name, _, payload = self._entries[i]
+      if len(results) == limit:
+        break
+      if identifier in results or (accept is not None and not accept(payload)):
+        continue
+      results[identifier] = name
+
+  def search(self, query: str, limit: int=25, accept=None):
+    """Returns up to `limit` (identifier, name) tuples matching the query, best matches first. 
+    `accept` is an optional predicate on the entries payloads."""
+    query = normalize_name(query)
+    if len(query) == 0:
+      return []
+
+    results = dict()  # keeps insertion order
+    # an object has at most one entry per locale, hence 2 * limit
+    self._collect(self._rank(query, self._word_prefix_candidates(query), 2 * limit), results, limit, accept=accept)
+
+    if len(results) < limit and len(query) >= self.MIN_NGRAM_QUERY:
+      substring_candidates = self._substring_candidates(query)
+      self._collect(self._rank(query, substring_candidates, 2 * limit + len(results)), results, limit, accept=accept)
+      if len(substring_candidates) == 0:
+        self._collect(self._fuzzy_candidates(query), results, limit, accept=accept)
+
+    return list(results.items())
+
+
+_item_index = NameIndex().freeze()
+_recipe_index = NameIndex().freeze()
+
+
+def get_item_name_index() -> NameIndex:
+  return _item_index
+
+
+def get_recipe_name_index() -> NameIndex:
+  """Recipe names index, the payload of the entries is the recipe profession"""
+  return _recipe_index
+
+
+def build_name_indexes(item_rows, recipe_rows):
+  """Builds the item and recipe name indexes from (id, name_en, name_fr) item rows and (id, name_en, name_fr, profession) 
+  recipe rows"""
+  item_index = NameIndex()
+  for _id, name_en, name_fr in item_rows:
+    item_index.add(_id, [name_en, name_fr])
+  recipe_index = NameIndex()
+  for _id, name_en, name_fr, profession in recipe_rows:
+    recipe_index.add(_id, [name_en, name_fr], payload=profession)
+  return item_index.freeze(), recipe_index.freeze()
+
+
+async def load_name_indexes(sess, reload: bool=False):
+  """Builds the item and recipe name indexes from the database (in a worker thread not to block the event loop). 
+  Items and recipes are reference data, the indexes are not built again (e.g. on reconnection) unless `reload` is True."""
+  global _item_index, _recipe_index
+  if not reload and (len(_item_index) > 0 or len(_recipe_index) > 0):
+    return
+  item_rows = (await sess.execute(select(Item.id, Item.name_en, Item.name_fr))).all()
+  recipe_rows = (await sess.execute(select(Recipe.id, Recipe.name_en, Recipe.name_fr, Recipe.profession))).all()
+  loop = asyncio.get_running_loop()
+  _item_index, _recipe_index = await loop.run_in_executor(None, build_name_indexes, item_rows, recipe_rows)
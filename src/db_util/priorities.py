@@ -106,17 +106,19 @@ def enum_get(e: Enum, k, default=None):
 class PriorityList(object):
 
   def __init__(self, prio_array: list) -> None:
-    self._priorities = self._parse(prio_array)
+    self._priorities, self._role_index = self._parse(prio_array)
+    self._tiers_with_roles = {tier for tier, _ in self._role_index.values()}
 
   def has_roles(self):
-    return any([self.tier_has_roles(tier) for tier in self._priorities.keys()])
+    return len(self._role_index) > 0
 
   def tier_has_roles(self, tier):
-    return sum([len(sublevel) for sublevels in self._priorities.get(tier, []) for sublevel in sublevels]) > 0
+    return tier in self._tiers_with_roles
 
   def _parse(self, array):
+    """Returns the priorities (tier => list of sublevel sets) and the role index (role tuple => (tier, sublevel index))"""
     prios = defaultdict(list)
-    already_processed = set()
+    role_index = dict()
     curr_index = 0
     for curr_tier in PrioTierEnum.useful_tiers():
       prios[curr_tier].append(set())
@@ -134,18 +136,14 @@ class PriorityList(object):
             prios[curr_tier].append(set())
           else: raise InvalidSepError(curr_index, elem)
         else:
-          if elem in already_processed:
+          if elem in role_index:
             raise DuplicateRoleError(curr_index, elem)
-          already_processed.add(elem)
+          role_index[elem] = (curr_tier, len(prios[curr_tier]) - 1)
           prios[curr_tier][-1].add(elem)
-    return prios
+    return prios, role_index
 
   def get_priority_tier(self, query: tuple):
-    for tier_prio, sublevels in self._priorities.items():
-      for level in sublevels:
-        if query in level:
-          return tier_prio
-    return PrioTierEnum.IS_USELESS
+    return self._role_index.get(query, (PrioTierEnum.IS_USELESS, None))[0]
 
   def get_for_tier(self, tier: PrioTierEnum):
     return self._priorities[tier]
@@ -156,18 +154,11 @@ class PriorityList(object):
     q1 = q2 => return 0
     q1 > q2 => return positive
     """ 
-    prio1 = self.get_priority_tier(query1)
-    prio2 = self.get_priority_tier(query2)
+    prio1, index1 = self._role_index.get(query1, (PrioTierEnum.IS_USELESS, None))
+    prio2, index2 = self._role_index.get(query2, (PrioTierEnum.IS_USELESS, None))
     if prio1 != prio2:
       return prio2.value - prio1.value
     else:
-      sublevels = self._priorities[prio1]
-      index1, index2 = None, None
-      for i, sublevel in enumerate(sublevels):
-        if query1 in sublevel:
-          index1 = i
-        if query2 in sublevel: 
-          index2 = i
       return index2 - index1
 
   def is_better(self, query1, query2):
@@ -201,7 +192,19 @@ def format_role_list(roles, role_names_map: dict):
   return [role_names_map.get(role, "???") for role in roles]
 
 
-async def generate_prio_str_for_item(sess, id_guild, item: Item, item_priority: ItemWithPriority, item_level: int, role_names_map: dict= None, character_map: dict = None, user_dkp_map: dict = None, loots_per_char: dict = None):
+async def fetch_looted_by(sess, id_guild, item_ids):
+  """Maps each item identifier with the set of identifiers of the guild characters who have looted it"""
+  query = select(Loot.id_item, Loot.id_character).distinct() \
+    .join(Character, Loot.id_character == Character.id) \
+    .where(Character.id_guild == id_guild, Loot.id_item.in_(list(item_ids)))
+  results = await sess.execute(query)
+  looted_by = defaultdict(set)
+  for id_item, id_character in results.all():
+    looted_by[id_item].add(id_character)
+  return looted_by
+
+
+async def generate_prio_str_for_item(sess, id_guild, item: Item, item_priority: ItemWithPriority, item_level: int, role_names_map: dict= None, character_map: dict = None, user_dkp_map: dict = None, loots_per_char: dict = None, looted_by: set = None):
   """
   Parameters
   ----------
@@ -222,6 +225,8 @@ async def generate_prio_str_for_item(sess, id_guild, item: Item, item_priority:
     Maps a user identifier with its dkp score
   loots_per_char: dict
     Maps character id with its loots for the slot if the item
+  looted_by: set
+    Identifiers of the characters who have already looted the item (see `fetch_looted_by`), fetched if None
 
   Returns
   -------
@@ -229,7 +234,7 @@ async def generate_prio_str_for_item(sess, id_guild, item: Item, item_priority:
     Maps prio tier enum to it prioritized list of players/roles
   """
   item_id = item.id
-  item_slot = ItemInventoryTypeEnum(item.metadata_["InventoryType"]).get_slot()
+  item_slot = ItemInventoryTypeEnum(item.inventory_type or 0).get_slot()
   priority = item_priority._priority_list
   if not priority.has_roles():
     return empty_prio_str_dict()
@@ -245,10 +250,9 @@ async def generate_prio_str_for_item(sess, id_guild, item: Item, item_priority:
     loots_per_char = defaultdict(list)
   
   # consider already looted items
-  already_looted_query = select(Loot).where(Loot.id_item == item_id, Loot.character.has(Character.id_guild == id_guild))
-  already_looted_results = await sess.execute(already_looted_query)
-  curr_item_loots = already_looted_results.scalars().all()
-  characters_have_looted = {loot.id_character for loot in curr_item_loots}
+  if looted_by is None:
+    looted_by = (await fetch_looted_by(sess, id_guild, [item_id]))[item_id]
+  characters_have_looted = looted_by
 
   prio_str_dict = dict()
   for tier in PrioTierEnum:
@@ -269,12 +273,12 @@ async def generate_prio_str_for_item(sess, id_guild, item: Item, item_priority:
           char_ilvl = "-"
           if len(loots_per_char[char.id]) > 0:
             best_loot, _ = loots_per_char[char.id][0]
-            char_ilvl = str(best_loot.item.metadata_["ItemLevel"])
+            char_ilvl = str(best_loot.item.item_level)
           # has looted an upgrade ? (only if equippable and not a bis)
           if item_slot is not None and tier is not PrioTierEnum.IS_BIS and len(loots_per_char[char.id]) > 0:
             char_loots = loots_per_char[char.id]
             best_loot, best_loot_tier = char_loots[0]
-            if tier.value >= best_loot_tier.value and item_level <= best_loot.item.metadata_["ItemLevel"]:
+            if tier.value >= best_loot_tier.value and (item_level or 0) <= (best_loot.item.item_level or 0):
               continue 
           found_characters.append(f"{char.name} ({user_dkp}, {char_ilvl})")
         sublevel_characters.extend(found_characters)
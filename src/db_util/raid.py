@@ -6,12 +6,56 @@ from models import Raid
 
 from pycord18n.extension import _ as _t
 
+
+class RaidCatalog(object):
+  """In-memory catalog of the raids. Raids are transient instances (never attached to a session) and 
+  must not be modified: the catalog is reloaded when a raid is updated."""
+  def __init__(self, raids) -> None:
+    self._raids = {raid.id: raid for raid in sorted(raids, key=lambda raid: raid.id)}
+
+  def get(self, id_raid: int):
+    return self._raids.get(id_raid)
+
+  @staticmethod
+  def is_open(raid: Raid, when: datetime.datetime=None):
+    if when is None:
+      when = datetime.datetime.utcnow()
+    return raid.open_at <= when
+
+  def raids(self, open_only=False, when: datetime.datetime=None):
+    return [raid for raid in self._raids.values() if not open_only or self.is_open(raid, when=when)]
+
+  def __len__(self):
+    return len(self._raids)
+
+
+_raid_catalog = None
+
+
+async def load_raid_catalog(sess):
+  """(Re)loads the raid catalog from the database"""
+  global _raid_catalog
+  results = await sess.execute(select(Raid.__table__))
+  _raid_catalog = RaidCatalog([Raid(**row) for row in results.mappings().all()])
+  return _raid_catalog
+
+
+async def get_raid_catalog(sess):
+  """The raid catalog, loaded with the given session if this was not done yet"""
+  if _raid_catalog is None:
+    return await load_raid_catalog(sess)
+  return _raid_catalog
+
+
+async def get_raid(sess, id_raid: int):
+  raid = (await get_raid_catalog(sess)).get(id_raid)
+  if raid is None:
+    raise InvalidArgument(_t("attendance.invalid.unknown_raid"))
+  return raid
+
+
 async def get_raids(session, open_only=False):
-  query = select(Raid)
-  if open_only:
-    query = query.where(Raid.open_at <= datetime.datetime.utcnow())
-  results = await session.execute(query)
-  return results.scalars().all()
+  return (await get_raid_catalog(session)).raids(open_only=open_only)
 
 
 async def update_raid_open_at(sess, id_raid, open_at: datetime.datetime):
@@ -20,4 +64,4 @@ async def update_raid_open_at(sess, id_raid, open_at: datetime.datetime):
     raise InvalidArgument(_t("raid.open.update.notfound"))
   raid.open_at = open_at.astimezone(pytz.UTC).replace(tzinfo=None)
   await sess.commit()
-
+  await load_raid_catalog(sess)
@@ -0,0 +1,69 @@
+import os
+from cachetools import TTLCache
+from models import GuildSettings
+
+
+_settings_cache = None  # id_guild => GuildSettings (detached) or None if the guild has no settings
+_settings_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_MISSING = object()
+
+
+def _get_settings_cache():
+  """Process-wide settings cache, entries expire after `SETTINGS_CACHE_TTL` seconds"""
+  global _settings_cache
+  if _settings_cache is None:
+    _settings_cache = TTLCache(
+      maxsize=int(os.getenv("SETTINGS_CACHE_SIZE", "1024")),
+      ttl=float(os.getenv("SETTINGS_CACHE_TTL", "600"))
+    )
+  return _settings_cache
+
+
+def _get_cached_settings(id_guild: str):
+  """Cached settings of a guild, `_MISSING` on cache miss"""
+  settings = _get_settings_cache().get(id_guild, _MISSING)
+  if settings is not _MISSING:
+    _settings_cache_stats["hits"] += 1
+  return settings
+
+
+def _settings_locale(settings):
+  if settings is None:
+    return GuildSettings.DEFAULT_LOCALE
+  return settings.locale
+
+
+async def get_guild_settings(sess, id_guild: str):
+  """Settings of a guild (None if it has none), only queried from the database on cache miss.
+  The returned instance is detached from the session and must not be modified."""
+  settings = _get_cached_settings(id_guild)
+  if settings is not _MISSING:
+    return settings
+  _settings_cache_stats["misses"] += 1
+  settings = await sess.get(GuildSettings, id_guild)
+  if settings is not None:
+    sess.expunge(settings)
+  _get_settings_cache()[id_guild] = settings
+  return settings
+
+
+async def get_guild_locale(sess, id_guild: str):
+  return _settings_locale(await get_guild_settings(sess, id_guild))
+
+
+def get_cached_guild_locale(id_guild: str):
+  """Locale of a guild if its settings are cached, None otherwise (does not access the database)"""
+  settings = _get_cached_settings(id_guild)
+  if settings is _MISSING:
+    return None
+  return _settings_locale(settings)
+
+
+def invalidate_guild_settings(id_guild: str):
+  """To call after the settings of a guild were updated"""
+  _settings_cache_stats["invalidations"] += 1
+  _get_settings_cache().pop(id_guild, None)
+
+
+def get_settings_cache_stats():
+  return {**_settings_cache_stats, "size": len(_get_settings_cache())}
\ No newline at end of file
@@ -386,6 +386,16 @@ class SpecEnum(HumanReadableEnum):
     return self.role == role and self.character_class == _class
 
 
+class DkpEventTypeEnum(HumanReadableEnum):
+  ATTENDANCE = 1
+  LOOT = 2
+  RESET = 3
+
+  @property
+  def i18n_prefix(self):
+    return "wow.dkp.event"
+
+
 class RaidSizeEnum(HumanReadableEnum):
   RAID10 = 1
   RAID25 = 2
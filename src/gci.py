@@ -1,10 +1,15 @@
 import logging
-from discord import PartialEmoji, RawReactionActionEvent
+from discord import RawReactionActionEvent
 import discord
 from discord.ext import commands
-from sqlalchemy import select
-from database import init_db
-from models import GuildCharter
+from database import get_pool_metrics, init_db
+from db_util.charter import get_charter_sign_role, load_charter_sign_index
+from db_util.name_index import load_name_indexes
+from db_util.raid import load_raid_catalog
+from db_util.settings import get_settings_cache_stats
+from gsheet_helpers import shutdown_gsheet_executor
+from metrics import after_command, before_command, get_metrics_registry, instrument_engine, start_metrics_server
+from raid_helper_client import close_raid_helper_client
 
 class GuildClockInBot(commands.Bot):
   def __init__(self, *args, **kwargs) -> None:
@@ -31,7 +36,11 @@ class GuildClockInBot(commands.Bot):
         
     self._db_session_class = None
     self._db_engine = None
-    self._db_session = None
+    self._metrics_runner = None
+
+    self.before_invoke(before_command)
+    self.after_invoke(after_command)
+    get_metrics_registry().add_collector(self._collect_metrics)
 
   @property
   def db_session_class(self):
@@ -42,85 +51,95 @@ class GuildClockInBot(commands.Bot):
     return self._db_engine
 
   @property
-  def db_session(self):
-    return self._db_session
+  def db_pool_metrics(self):
+    if self._db_engine is None:
+      return dict()
+    return get_pool_metrics(self._db_engine)
+  
+  def _collect_metrics(self):
+    """Database pool and settings cache gauges"""
+    gauges = [(f"gci_db_pool_{key}", "Database connection pool state.", value, {}) for key, value in self.db_pool_metrics.items()]
+    gauges.extend([(f"gci_settings_cache_{key}", "Guild settings cache counters.", value, {}) for key, value in get_settings_cache_stats().items()])
+    return gauges
   
   async def on_ready(self):
     await self._connect_db()
     logging.getLogger().info("Database connection: successful")
+    if self._metrics_runner is None:
+      self._metrics_runner = await start_metrics_server()
     info = await self.application_info()
     guilds = await self.fetch_guilds().flatten()
     logging.getLogger().info(f"App info: {info.name} ({info.id}), currently running in {len(guilds)} guild(s)." )
     logging.getLogger().info("Bot is ready.")
 
+  async def close(self):
+    shutdown_gsheet_executor()
+    await close_raid_helper_client()
+    if self._metrics_runner is not None:
+      await self._metrics_runner.cleanup()
+      self._metrics_runner = None
+    await super().close()
+
   async def _disconnect_db(self):
     await self._do_disconnect_db()
     logging.getLogger().info("Bot disconnected from the database.")
 
   async def _do_disconnect_db(self):
-    if self._db_session is not None:
-      self._db_session.close()
     if self._db_engine is not None:
+      logging.getLogger().info(f"Database pool metrics: {get_pool_metrics(self._db_engine)}")
       await self._db_engine.dispose()
 
-    self._db_session = None
     self._db_engine = None
     self._db_session_class = None
 
   async def _connect_db(self):
     await self._do_disconnect_db()
     self._db_session_class, self._db_engine = await init_db()
-    self._db_session = self._db_session_class()
+    instrument_engine(self._db_engine)
     logging.getLogger().info("Bot successfully connected to the database.")
+    async with self._db_session_class() as sess:
+      await load_name_indexes(sess)
+      await load_raid_catalog(sess)
+      sign_count = await load_charter_sign_index(sess)
+    logging.getLogger().info("Item and recipe name indexes and raid catalog loaded.")
+    logging.getLogger().info(f"Charter sign index loaded ({sign_count} published charters).")
 
   async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
     """Watch for reactions on published charters."""
     guild = self.get_guild(payload.guild_id)
     if guild is None:
-        return
+      return
+
+    id_role = get_charter_sign_role(str(guild.id), str(payload.message_id), payload.emoji)
+    if id_role is None: # not a charter sign reaction
+      return
+
+    role = guild.get_role(int(id_role))
+    if role is None: # role does not exists
+      return 
     
-    sess = self._db_session
-    async with sess.begin():
-      guild_id = str(guild.id)
-      result = await sess.execute(select(GuildCharter).where(GuildCharter.id_guild == guild_id))
-      charter = result.unique().scalars().one_or_none()
-      sign_emoji = PartialEmoji(name=charter.sign_emoji)
-      if charter is None or charter.id_sign_message is None or \
-          charter.id_sign_message != str(payload.message_id) or payload.emoji != sign_emoji:
-        return
-
-      role = guild.get_role(int(charter.id_sign_role))
-      if role is None: # role does not exists
-        return 
-      
-      try:
-        await payload.member.add_roles(role) 
-      except discord.HTTPException as e:
-        logging.getLogger().error(f"cannot add reaction role: {str(e)}")
+    try:
+      await payload.member.add_roles(role) 
+    except discord.HTTPException as e:
+      logging.getLogger().error(f"cannot add reaction role: {str(e)}")
 
   async def on_raw_reaction_remove(self, payload: RawReactionActionEvent):
     guild = self.get_guild(payload.guild_id)
     if guild is None:
       return
-    sess = self._db_session
-    async with sess.begin():
-      guild_id = str(guild.id)
-      result = await sess.execute(select(GuildCharter).where(GuildCharter.id_guild == guild_id))
-      charter = result.unique().scalars().one_or_none()
-      sign_emoji = PartialEmoji(name=charter.sign_emoji)
-
-      if charter is None or charter.id_sign_message is None or \
-          charter.id_sign_message != str(payload.message_id) or payload.emoji != sign_emoji:
-        return
-      
-      role = guild.get_role(int(charter.id_sign_role))
-      member = guild.get_member(payload.user_id)
-      if role is None or member is None: # role does not exists
-        return 
-
-      try:
-        await member.remove_roles(role) 
-      except discord.HTTPException as e:
-        logging.getLogger().error(f"cannot remove reaction role: {str(e)}")
+
+    id_role = get_charter_sign_role(str(guild.id), str(payload.message_id), payload.emoji)
+    if id_role is None: # not a charter sign reaction
+      return
+    
+    role = guild.get_role(int(id_role))
+    member = guild.get_member(payload.user_id)
+    if role is None or member is None: # role does not exists
+      return 
+
+    try:
+      await member.remove_roles(role) 
+    except discord.HTTPException as e:
+      logging.getLogger().error(f"cannot remove reaction role: {str(e)}")
     
       
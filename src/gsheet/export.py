@@ -1,16 +1,21 @@
+import datetime
 import pygsheets
 
 from collections import defaultdict
-from pygsheets import Spreadsheet, Worksheet, Cell, DataRange
+from pygsheets import Spreadsheet, Worksheet, DataRange
 from discord import Guild, InvalidArgument, Client, Role
-from sqlalchemy import select, Integer
-from db_util.dkp import compute_dkp_score
-from db_util.priorities import PrioTierEnum, generate_prio_str_for_item
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db_util.attendance import fetch_guild_attendance_matrix
+from db_util.dkp import compute_guild_dkp_scores
+from db_util.priorities import PrioTierEnum, fetch_looted_by, generate_prio_str_for_item
 from db_util.raid_helper import extract_raid_helpers_data
+from db_util.settings import get_guild_settings
 from db_util.wow_data import ItemInventoryTypeEnum, MainStatusEnum
-from gsheet.parse_priorities import PrioParser
-from gsheet_helpers import get_creds
-from models import Character, GuildSettings, Item, Loot
+from gsheet.prio_cache import SheetRevisionTracker, get_prio_parser, restamp_prio_cache
+from gsheet.worksheet_diff import changed_row_ranges, column_label, pad_row, table_state
+from gsheet_helpers import get_creds, get_sheet_service, run_in_gsheet_pool
+from models import Character, ExportedWorksheet, Item, Loot, Raid
 from pycord18n.extension import _ as _t
 from lang.util import localized_attr
 from db_util.wow_data import InventorySlotEnum, ItemInventoryTypeEnum
@@ -41,6 +46,96 @@ def create_worksheet(sheet: Spreadsheet, name: str, table) -> Worksheet:
   return worksheet
 
 
+def find_worksheet(sheet: Spreadsheet, name: str) -> Worksheet:
+  """Returns the worksheet with the given name, None if there is none"""
+  for worksheet in sheet.worksheets():
+    if worksheet.title == name:
+      return worksheet
+  return None
+
+
+def update_changed_rows(sheet: Spreadsheet, worksheet: Worksheet, table, previous_state: dict, state: dict):
+  """Sends only the rows that changed since the previous export in a single values batchUpdate (blocking). 
+  Rows are padded to the widest of both versions and rows that were removed are cleared. The worksheet grid is grown 
+  first if the table does not fit in it (the update would be rejected otherwise).
+  """
+  n_cols = max(previous_state["n_cols"], state["n_cols"], 1)
+  if worksheet.rows < len(table) + 1:
+    worksheet.rows = len(table) + 1
+  if worksheet.cols < n_cols:
+    worksheet.cols = n_cols
+  data = list()
+  for start, end in changed_row_ranges(previous_state["row_hashes"], state["row_hashes"]):
+    data.append({
+      "range": f"'{worksheet.title}'!A{start + 1}:{column_label(n_cols)}{end}",
+      "values": [pad_row(table[i] if i < len(table) else [], n_cols) for i in range(start, end)]
+    })
+  if len(data) > 0:
+    body = {"valueInputOption": "USER_ENTERED", "data": data}
+    get_sheet_service().spreadsheets().values().batchUpdate(spreadsheetId=sheet.id, body=body).execute()
+
+
+def write_worksheet(sheet: Spreadsheet, name: str, table, previous_state: dict=None, format_rows=None):
+  """Writes a table in a worksheet (blocking). If the state of the previous export of this worksheet is given, 
+  only the rows that changed are sent and unchanged worksheets are skipped entirely. The worksheet is fully 
+  re-created if it is missing or if its formatted rows have changed.
+
+  Parameters
+  ----------
+  previous_state: dict
+    State of the previous export (see `table_state`), None if unknown
+  format_rows: list
+    Row numbers of the slot header rows for prio worksheets (see `prio_format_requests`), None for plain worksheets
+
+  Returns
+  -------
+  worksheet: Worksheet
+    The resulting worksheet
+  state: dict
+    State of this export
+  written: bool
+    False if the worksheet was left untouched
+  """
+  state = table_state(table, format_rows=format_rows)
+  worksheet = find_worksheet(sheet, name)
+  if worksheet is not None and previous_state is not None and previous_state["format_rows"] == state["format_rows"]:
+    written = previous_state["table_hash"] != state["table_hash"]
+    if written:
+      update_changed_rows(sheet, worksheet, table, previous_state, state)
+    return worksheet, state, written
+
+  worksheet = create_worksheet(sheet, name, table)
+  if format_rows is not None:
+    sheet.client.sheet.batch_update(sheet.id, prio_format_requests(worksheet, format_rows))
+  return worksheet, state, True
+
+
+async def export_worksheet(sess, sheet: Spreadsheet, id_guild: str, name: str, table, format_rows=None, revision_tracker: SheetRevisionTracker=None) -> Worksheet:
+  """Exports a table in a worksheet, sending only what changed since the last export. The export state is kept out of 
+  the transaction of `sess`, in transactions of its own: it is removed before writing the worksheet and only saved back 
+  once the worksheet is written, so that an export failing at any point forces a full rewrite on the next one. 
+  The spreadsheet revision is checked around the write if a revision tracker is given.
+  """
+  async with AsyncSession(sess.bind, expire_on_commit=False) as state_sess:
+    async with state_sess.begin():
+      exported = await state_sess.get(ExportedWorksheet, (id_guild, name))
+      previous_state = None
+      if exported is not None:
+        if exported.id_gsheet == sheet.id:
+          previous_state = exported.state
+        await state_sess.delete(exported)
+
+    if revision_tracker is not None:
+      await revision_tracker.before_write()
+    worksheet, state, written = await run_in_gsheet_pool(write_worksheet, sheet, name, table, previous_state=previous_state, format_rows=format_rows)
+    if revision_tracker is not None:
+      await revision_tracker.after_write(written=written)
+
+    async with state_sess.begin():
+      state_sess.add(ExportedWorksheet(id_guild=id_guild, name=name, id_gsheet=sheet.id, **state))
+  return worksheet
+
+
 async def create_characters_table(sess, guild_id):
   table = list()
 
@@ -90,6 +185,21 @@ async def create_loot_table(sess, guild_id):
   return table
 
 
+async def create_attendance_table(sess, guild_id):
+  """Attendances of the guild characters per raid reset, since the first reset of the expansion"""
+  first_reset = (await sess.execute(select(func.min(Raid.reset_start)))).scalar()
+  if first_reset is None:
+    return [["character", "total"]]
+  resets, rows = await fetch_guild_attendance_matrix(sess, guild_id, first_reset.date(), datetime.date.today())
+
+  table = list()
+  table.append(["character"] + [reset_start.strftime('%d/%m/%Y') for reset_start in resets] + ["total"])
+  for _, name, counts, total in rows:
+    table.append([name] + counts + [total])
+  
+  return table
+
+
 async def loots_for_slots(sess, slot: InventorySlotEnum, char_map: dict, priorities: dict):
   """Returs a dictionnary mapping character ids with list of tuples (=> [loot, tier level] )for this slot sorted by increasing priority tier and deacreasing ilvl
 
@@ -100,7 +210,7 @@ async def loots_for_slots(sess, slot: InventorySlotEnum, char_map: dict, priorit
   else:
     inv_types = slot.get_inventory_types()
   query = select(Loot).where(
-    Loot.item.has(Item.metadata_['InventoryType'].astext.cast(Integer).in_([it.value for it in inv_types])),
+    Loot.item.has(Item.inventory_type.in_([it.value for it in inv_types])),
     Loot.id_character.in_([char.id for char_list in char_map.values() for char, _ in char_list]),
     Loot.id_item.in_(list(priorities.keys()))
   )
@@ -121,14 +231,14 @@ async def loots_for_slots(sess, slot: InventorySlotEnum, char_map: dict, priorit
     # sort by increasing priority tier (first) and item level deacreasing (second)
     sort_key_fn = lambda loot_tuple: (
       loot_tuple[1].value,
-      -int(loot_tuple[0].item.metadata_['ItemLevel'])
+      -(loot_tuple[0].item.item_level or 0)
     )
     loot_per_character[id_character] = sorted(loots, key=sort_key_fn)
   
   return loot_per_character
 
 
-async def generate_prio_sheets(sess, gc, sheet, guild: Guild, priorities: dict, role2name: dict, for_event: str=None, phase: int=-1):
+async def generate_prio_sheets(sess, sheet, guild: Guild, priorities: dict, role2name: dict, for_event: str=None, phase: int=-1, revision_tracker: SheetRevisionTracker=None):
   """
   Parameters
   ----------
@@ -148,7 +258,7 @@ async def generate_prio_sheets(sess, gc, sheet, guild: Guild, priorities: dict,
   where_clause = [Character.main_status != MainStatusEnum.OTHER, Character.id_guild == str(guild.id)]
 
   # role filtering
-  settings = await sess.get(GuildSettings, str(guild.id))
+  settings = await get_guild_settings(sess, str(guild.id))
   id_prio_role = settings.id_prio_role
 
   if for_event is not None:
@@ -164,9 +274,10 @@ async def generate_prio_sheets(sess, gc, sheet, guild: Guild, priorities: dict,
   results = await sess.execute(query)
 
   characters = results.scalars().all()
+  dkp_scores = await compute_guild_dkp_scores(sess, str(guild.id), priorities)
   char_dict = defaultdict(list)
   for char in characters:
-    char_dkp = await compute_dkp_score(sess, char, priorities)
+    char_dkp = dkp_scores.get(char.id, 0)
     char_dict[(char.character_class, char.role, char.spec)].append((char, char_dkp))
 
   user_dkp_dict = defaultdict(lambda: 0)
@@ -189,17 +300,19 @@ async def generate_prio_sheets(sess, gc, sheet, guild: Guild, priorities: dict,
   per_class_sheet_table.append(headers)
   per_char_sheet_table.append(headers)
   
-  item_index = dict()
   per_slot = defaultdict(list)
 
+  items_results = await sess.execute(select(Item).where(Item.id.in_(list(priorities.keys()))))
+  item_index = {item.id: item for item in items_results.scalars().all()}
   for item_id in priorities.keys():
-    item = await sess.get(Item, item_id)
-    if item is None:
+    if item_id not in item_index:
       continue
-    item_index[item_id] = item
-    inventory_type = ItemInventoryTypeEnum(item.metadata_["InventoryType"])
+    inventory_type = ItemInventoryTypeEnum(item_index[item_id].inventory_type or 0)
     per_slot[inventory_type.get_slot()].append(item_id)
 
+  # characters who already have looted the items
+  looted_by = await fetch_looted_by(sess, str(guild.id), item_index.keys())
+
   # check phase
   if phase == -1:
     phase = max([prio.metadata["phase"] for prio in priorities.values()])
@@ -222,12 +335,12 @@ async def generate_prio_sheets(sess, gc, sheet, guild: Guild, priorities: dict,
       if phase != 0 and priorities[item_id].metadata["phase"] != phase:
         continue
       item = item_index[item_id]
-      row_header = [item.id, localized_attr(item, 'name'), item.metadata_["ItemLevel"]]
+      row_header = [item.id, localized_attr(item, 'name'), item.item_level]
       # per_class
       per_class_prio_dict = await generate_prio_str_for_item(
         sess, str(guild.id), 
         item, priorities[item_id], 
-        item.metadata_["ItemLevel"], 
+        item.item_level, 
         role2name, 
         loots_per_char=loots_per_character)
       per_class_sheet_table.append(row_header + [per_class_prio_dict.get(t, " ") for t in PrioTierEnum.useful_tiers()])
@@ -235,53 +348,81 @@ async def generate_prio_sheets(sess, gc, sheet, guild: Guild, priorities: dict,
       per_char_prio_dict = await generate_prio_str_for_item(
         sess, str(guild.id), 
         item, priorities[item_id], 
-        item.metadata_["ItemLevel"], 
+        item.item_level, 
         role2name, 
         char_dict, user_dkp_dict, 
-        loots_per_char=loots_per_character)
+        loots_per_char=loots_per_character,
+        looted_by=looted_by[item_id])
       per_char_sheet_table.append(row_header + [per_char_prio_dict.get(t, " ") for t in PrioTierEnum.useful_tiers()])
 
   # actually generate the sheet
   wksheets = list()
   for sheet_name, sheet_table in [("gci_prio", per_char_sheet_table), ("gci_prio_class", per_class_sheet_table)]: 
-    wks = create_worksheet(sheet, name=sheet_name, table=sheet_table)
+    wks = await export_worksheet(sess, sheet, str(guild.id), sheet_name, sheet_table, format_rows=slot_header_cell_merges, revision_tracker=revision_tracker)
     wksheets.append(wks)
-    gc.set_batch_mode(True)
-    # formatting
-    reference_style_cell = Cell("A1", worksheet=wks)
-    reference_style_cell.color = (0.576, 0.769, 0.49, 0)
-
-    for row_number in slot_header_cell_merges:
-      row = wks.get_row(row_number, returnas="range")
-      row.merge_cells()
-      row.apply_format(reference_style_cell, fields="userEnteredFormat.backgroundColor")
-
-    reference_style_cell.color = (0.22, 0.463, 0.114, 0)
-    reference_style_cell.set_text_format("bold", True)
-    reference_style_cell.set_text_format("foregroundColor", (1, 1, 1, 0))
-    wks.get_row(1, returnas="range").apply_format(reference_style_cell)
-    gc.run_batch()
-    gc.set_batch_mode(False)
   
   return wksheets
 
 
+SLOT_HEADER_COLOR = {"red": 0.576, "green": 0.769, "blue": 0.49, "alpha": 0}
+TABLE_HEADER_COLOR = {"red": 0.22, "green": 0.463, "blue": 0.114, "alpha": 0}
+TABLE_HEADER_TEXT_COLOR = {"red": 1, "green": 1, "blue": 1, "alpha": 0}
+
+
+def row_grid_range(wks: Worksheet, row_number: int):
+  """Grid range covering a full row (row number starts at 1)"""
+  return {
+    "sheetId": wks.id, 
+    "startRowIndex": row_number - 1, 
+    "endRowIndex": row_number, 
+    "startColumnIndex": 0, 
+    "endColumnIndex": wks.cols
+  }
+
+
+def prio_format_requests(wks: Worksheet, slot_header_rows):
+  """Builds the batchUpdate requests merging and coloring slot header rows and styling the table header"""
+  requests = list()
+  for row_number in slot_header_rows:
+    grid_range = row_grid_range(wks, row_number)
+    requests.append({"mergeCells": {"range": grid_range, "mergeType": "MERGE_ALL"}})
+    requests.append({"repeatCell": {
+      "range": grid_range,
+      "cell": {"userEnteredFormat": {"backgroundColor": SLOT_HEADER_COLOR}},
+      "fields": "userEnteredFormat.backgroundColor"
+    }})
+
+  requests.append({"repeatCell": {
+    "range": row_grid_range(wks, 1),
+    "cell": {"userEnteredFormat": {
+      "backgroundColor": TABLE_HEADER_COLOR, 
+      "textFormat": {"bold": True, "foregroundColor": TABLE_HEADER_TEXT_COLOR}
+    }},
+    "fields": "userEnteredFormat(backgroundColor,textFormat)"
+  }})
+  return requests
+
+
 async def export_in_worksheets(sess, guild: Guild, for_event: str=None, phase: int=-1):
-  settings = await sess.get(GuildSettings, str(guild.id))
+  settings = await get_guild_settings(sess, str(guild.id))
 
   if settings is None or settings.id_export_gsheet is None:
     raise InvalidArgument(_t("settings.gsheet.invalid.notconfigured"))
 
-  gc = pygsheets.authorize(custom_credentials=get_creds())
-  full_sheet = gc.open_by_key(settings.id_export_gsheet)
+  gc = await run_in_gsheet_pool(pygsheets.authorize, custom_credentials=get_creds())
+  full_sheet = await run_in_gsheet_pool(gc.open_by_key, settings.id_export_gsheet)
+
+  # parse prio (before writing, which changes the spreadsheet revision)
+  prio_parser, revision_tracker = await get_prio_parser(sess, full_sheet)
   
   characters_table = await create_characters_table(sess, str(guild.id))
-  chr_worksheet = create_worksheet(full_sheet, "gci_characters", characters_table)
+  chr_worksheet = await export_worksheet(sess, full_sheet, str(guild.id), "gci_characters", characters_table, revision_tracker=revision_tracker)
   loots_table = await create_loot_table(sess, str(guild.id))
-  lts_worksheet = create_worksheet(full_sheet, "gci_loots", loots_table)
+  lts_worksheet = await export_worksheet(sess, full_sheet, str(guild.id), "gci_loots", loots_table, revision_tracker=revision_tracker)
+  attendance_table = await create_attendance_table(sess, str(guild.id))
+  await export_worksheet(sess, full_sheet, str(guild.id), "gci_attendance", attendance_table, revision_tracker=revision_tracker)
 
-  # parse prio
-  prio_parser = PrioParser(full_sheet)
-  char_prio_sheet, class_prio_sheet = await generate_prio_sheets(sess, gc, full_sheet, guild, prio_parser._item_prio, prio_parser._role2name, for_event=for_event, phase=phase)
+  char_prio_sheet, class_prio_sheet = await generate_prio_sheets(sess, full_sheet, guild, prio_parser._item_prio, prio_parser._role2name, for_event=for_event, phase=phase, revision_tracker=revision_tracker)
+  await restamp_prio_cache(sess, revision_tracker)
 
-  return chr_worksheet, lts_worksheet, char_prio_sheet, class_prio_sheet, prio_parser
\ No newline at end of file
+  return chr_worksheet, lts_worksheet, char_prio_sheet, class_prio_sheet, prio_parser
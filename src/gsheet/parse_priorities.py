@@ -1,4 +1,4 @@
-
+import json
 from pygsheets import Spreadsheet, Worksheet, Cell
 from db_util.wow_data import ClassEnum, RoleEnum, SpecEnum
 from db_util.priorities import ItemWithPriority, ParseError, PriorityError, PriorityList, SepEnum, enum_get
@@ -8,16 +8,23 @@ class PrioParser(object):
   PRIO_SHEET_TITLE_PREFIX = "prio_"
   CONFIG_SHEET_NAME = "config_roles"
 
-  def __init__(self, gsheet: Spreadsheet) -> None:
+  CACHE_FORMAT_VERSION = 1
+
+  def __init__(self, gsheet: Spreadsheet, values=None) -> None:
+    """values: raw values of the config and prio worksheets (in this order), downloaded from the spreadsheet if None"""
     self._gsheet = gsheet
-    self._name2role = self._parse_roles()
+    prio_worksheets = self._prio_worksheets(gsheet)
+    self._titles = [ws.title for ws in prio_worksheets]
+    if values is None:
+      values = self._fetch_values([self.CONFIG_SHEET_NAME] + self._titles)
+    self._values = values
+    config_values, *prio_values = values
+    self._name2role = self._parse_roles(config_values)
     self._role2name = {v: k for k, v in self._name2role.items()}
     self._item_prio = dict()
     self._errors = list()
-    for ws in gsheet.worksheets():
-      if not ws.title.startswith(self.PRIO_SHEET_TITLE_PREFIX):
-        continue
-      new_items, ws_errors = self._read_prio_sheet(ws)
+    for ws, values in zip(prio_worksheets, prio_values):
+      new_items, ws_errors = self._read_prio_sheet(values)
       interesected_items = set(new_items.keys()).intersection(self._item_prio.keys())
       if len(interesected_items) > 0:
         raise ParseError("duplicate items in different sheets")
@@ -27,6 +34,33 @@ class PrioParser(object):
         ws_error.worksheet = ws
         self._errors.append(ws_error)
 
+  @classmethod
+  def _prio_worksheets(cls, gsheet: Spreadsheet):
+    return [ws for ws in gsheet.worksheets() if ws.title.startswith(cls.PRIO_SHEET_TITLE_PREFIX)]
+
+  def to_cache(self) -> bytes:
+    """Serializes the raw worksheet values the priorities were parsed from (not the parsed objects, so that the cache 
+    does not depend on the priority classes)"""
+    return json.dumps({
+      "version": self.CACHE_FORMAT_VERSION,
+      "titles": self._titles,
+      "values": self._values
+    }).encode("utf-8")
+
+  @classmethod
+  def from_cache(cls, gsheet: Spreadsheet, data: bytes):
+    """Parses the priorities again from cached worksheet values (see `to_cache`) without downloading them. 
+    Returns None if the cached data cannot be used (other format version or other prio worksheets)."""
+    try:
+      cached = json.loads(data)
+    except ValueError:
+      return None
+    if not isinstance(cached, dict) or cached.get("version") != cls.CACHE_FORMAT_VERSION:
+      return None
+    if cached.get("titles") != [ws.title for ws in cls._prio_worksheets(gsheet)]:
+      return None
+    return cls(gsheet, values=cached["values"])
+
   @property
   def items(self):
     return self._item_prio
@@ -41,10 +75,20 @@ class PrioParser(object):
   def __len__(self):
     return len(self._item_prio)
 
-  def _parse_roles(self):
-    ws = self._gsheet.worksheet_by_title(self.CONFIG_SHEET_NAME)
+  def _fetch_values(self, titles):
+    """Downloads the values of the given worksheets with a single values batchGet. 
+    Rows are padded with empty strings as the API drops trailing empty cells."""
+    ranges = ["'{}'".format(title.replace("'", "''")) for title in titles]
+    value_ranges = self._gsheet.client.sheet.values_batch_get(self._gsheet.id, ranges)
+    all_values = list()
+    for value_range in value_ranges:
+      values = value_range.get("values", [])
+      n_cols = max([len(row) for row in values], default=0)
+      all_values.append([row + [""] * (n_cols - len(row)) for row in values])
+    return all_values
+
+  def _parse_roles(self, values):
     EXPECTED_HEADERS = ["class", "role", "spec", "name"]
-    values = ws.get_all_values()
     headers = values[0]
     columns = {header: headers.index(header) for header in EXPECTED_HEADERS}
 
@@ -60,9 +104,8 @@ class PrioParser(object):
     
     return name_map
 
-  def _read_prio_sheet(self, ws: Worksheet):
+  def _read_prio_sheet(self, values):
     PRIO_COLUMNS = ['id', 'boss', 'phase', 'comment']
-    values = ws.get_all_values()
     headers = values[0]
     columns = {header: headers.index(header) for header in PRIO_COLUMNS}
     errors = dict()
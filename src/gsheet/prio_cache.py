@@ -0,0 +1,93 @@
+from pygsheets import Spreadsheet
+from gsheet.parse_priorities import PrioParser
+from gsheet_helpers import get_sheet_revision, get_sheet_revision_info, run_in_gsheet_pool
+from models import PrioCache
+
+
+# id_gsheet => (revision, parser)
+_prio_parsers = dict()
+
+
+class SheetRevisionTracker(object):
+  """Follows the revision of a spreadsheet across the writes of an export to tell the changes made by the export
+  apart from edits made by someone else in the meantime. The revision is read before each write: it must be the one 
+  left by the previous write (or the one the priorities were read at). It is read again after each actual write: it 
+  must have changed and the last modification must have been made by the bot.
+  """
+  def __init__(self, id_gsheet: str, revision: str) -> None:
+    self._id_gsheet = id_gsheet
+    self._revision = revision
+    self._foreign_edit = False
+
+  @property
+  def id_gsheet(self):
+    return self._id_gsheet
+
+  @property
+  def revision(self):
+    return self._revision
+
+  @property
+  def foreign_edit(self):
+    """True if the spreadsheet was edited by someone else during the export"""
+    return self._foreign_edit
+
+  async def before_write(self):
+    if self._foreign_edit:
+      return
+    revision = await run_in_gsheet_pool(get_sheet_revision, self._id_gsheet)
+    self._foreign_edit = revision != self._revision
+
+  async def after_write(self, written: bool=True):
+    """`written` is False if the write was skipped, the next check will then tell if someone else edited the spreadsheet"""
+    if self._foreign_edit or not written:
+      return
+    revision, by_bot = await run_in_gsheet_pool(get_sheet_revision_info, self._id_gsheet)
+    # an unchanged revision is not the one of our write (not visible yet): it cannot be restamped either
+    self._foreign_edit = revision == self._revision or not by_bot
+    self._revision = revision
+
+
+async def get_prio_parser(sess, sheet: Spreadsheet):
+  """Returns the parsed priorities of a spreadsheet and a tracker of its revision for the writes that follow (see
+  `restamp_prio_cache`). The spreadsheet revision is checked first (cheap metadata call), the priorities are only
+  downloaded again if it has changed since their values were cached (in memory or in database).
+  """
+  revision = await run_in_gsheet_pool(get_sheet_revision, sheet.id)
+  tracker = SheetRevisionTracker(sheet.id, revision)
+  cached_revision, parser = _prio_parsers.get(sheet.id, (None, None))
+  if cached_revision == revision:
+    return parser, tracker
+
+  entry = await sess.get(PrioCache, sheet.id)
+  parser = None
+  if entry is not None and entry.revision == revision:
+    parser = PrioParser.from_cache(sheet, entry.data)
+  if parser is None:
+    parser = await run_in_gsheet_pool(PrioParser, sheet)
+    if entry is None:
+      entry = PrioCache(id_gsheet=sheet.id)
+      sess.add(entry)
+    entry.revision = revision
+    entry.data = parser.to_cache()
+
+  _prio_parsers[sheet.id] = (revision, parser)
+  return parser, tracker
+
+
+async def restamp_prio_cache(sess, tracker: SheetRevisionTracker):
+  """Exporting in the spreadsheet changes its revision although the priorities did not change: marks the cached
+  priorities as valid for the revision left by the export. If someone else edited the spreadsheet during the export,
+  the cached priorities are dropped instead (the edit could be a priority change).
+  """
+  id_gsheet = tracker.id_gsheet
+  entry = await sess.get(PrioCache, id_gsheet)
+  if tracker.foreign_edit:
+    _prio_parsers.pop(id_gsheet, None)
+    if entry is not None:
+      await sess.delete(entry)
+    return
+  if id_gsheet in _prio_parsers:
+    _prio_parsers[id_gsheet] = (tracker.revision, _prio_parsers[id_gsheet][1])
+  if entry is not None:
+    entry.revision = tracker.revision
\ No newline at end of file
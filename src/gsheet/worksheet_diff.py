@@ -0,0 +1,62 @@
+import hashlib
+import json
+
+
+def hash_row(row) -> str:
+  """Hash of the content of a table row"""
+  return hashlib.sha1(json.dumps(["" if v is None else str(v) for v in row]).encode("utf-8")).hexdigest()
+
+
+def table_state(table, format_rows=None) -> dict:
+  """
+  Parameters
+  ----------
+  table: list
+    List of list representing a 2D array (rows first).
+  format_rows: list
+    Row numbers of rows with a specific formatting (merged, colored,...), None if the table is not formatted.
+
+  Returns
+  -------
+  state: dict
+    Describes the exported table: 'table_hash', 'row_hashes', 'n_cols' and 'format_rows'
+  """
+  row_hashes = [hash_row(row) for row in table]
+  return {
+    "table_hash": hashlib.sha1("".join(row_hashes).encode("utf-8")).hexdigest(),
+    "row_hashes": row_hashes,
+    "n_cols": max([len(row) for row in table], default=0),
+    "format_rows": None if format_rows is None else list(format_rows)
+  }
+
+
+def changed_row_ranges(old_hashes: list, new_hashes: list):
+  """Returns the (start, end) ranges of row indexes (end excluded) whose content changed between two versions 
+  of a table, rows added or removed are considered changed.
+  """
+  ranges = list()
+  start = None
+  for i in range(max(len(old_hashes), len(new_hashes))):
+    changed = i >= len(old_hashes) or i >= len(new_hashes) or old_hashes[i] != new_hashes[i]
+    if changed and start is None:
+      start = i
+    elif not changed and start is not None:
+      ranges.append((start, i))
+      start = None
+  if start is not None:
+    ranges.append((start, max(len(old_hashes), len(new_hashes))))
+  return ranges
+
+
+def column_label(number: int) -> str:
+  """Column label from its number (starting at 1), e.g. 1 => 'A', 28 => 'AB'"""
+  label = ""
+  while number > 0:
+    number, remainder = divmod(number - 1, 26)
+    label = chr(ord("A") + remainder) + label
+  return label
+
+
+def pad_row(row, n_cols: int):
+  """Pad a row with empty values (clearing the cells) up to n_cols columns"""
+  return ["" if v is None else v for v in row] + [""] * (n_cols - len(row))
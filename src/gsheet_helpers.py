@@ -1,7 +1,16 @@
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from discord import InvalidArgument
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from metrics import observe
+
+from pycord18n.extension import _ as _t
 
 
 class SheetStateEnum():
@@ -10,11 +19,63 @@ class SheetStateEnum():
   INVALID_PERMS = 3
 
 
+_gsheet_executor = None
+_creds = None
+_services = threading.local()  # the API clients are not thread-safe: one per thread of the gsheet pool
+
+
+def get_gsheet_executor():
+  """Thread pool running all the (blocking) Google Sheets calls, its size is set by `GSHEET_POOL_SIZE`"""
+  global _gsheet_executor
+  if _gsheet_executor is None:
+    pool_size = int(os.getenv("GSHEET_POOL_SIZE", "4"))
+    _gsheet_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="gsheet")
+  return _gsheet_executor
+
+
+def get_gsheet_timeout(check=False):
+  """Timeout (in seconds) for a Google Sheets call, `GSHEET_CHECK_TIMEOUT` for quick checks, `GSHEET_TIMEOUT` otherwise"""
+  if check:
+    return float(os.getenv("GSHEET_CHECK_TIMEOUT", "15"))
+  return float(os.getenv("GSHEET_TIMEOUT", "120"))
+
+
+async def run_in_gsheet_pool(fn, *args, timeout: float=None, **kwargs):
+  """Runs a blocking Google Sheets call in the gsheet thread pool and waits for its result without blocking the event loop.
+  Raises an InvalidArgument if the call does not complete before the timeout (default: `get_gsheet_timeout()`).
+  """
+  if timeout is None:
+    timeout = get_gsheet_timeout()
+  loop = asyncio.get_running_loop()
+  future = loop.run_in_executor(get_gsheet_executor(), partial(fn, *args, **kwargs))
+  start, outcome = time.perf_counter(), "error"
+  try:
+    result = await asyncio.wait_for(future, timeout=timeout)
+    outcome = "ok"
+    return result
+  except asyncio.TimeoutError:
+    outcome = "timeout"
+    raise InvalidArgument(_t("settings.gsheet.invalid.timeout"))
+  finally:
+    observe("gci_gsheet_call_duration_seconds", time.perf_counter() - start, call=getattr(fn, "__name__", "unknown"), outcome=outcome)
+
+
+def shutdown_gsheet_executor():
+  global _gsheet_executor
+  if _gsheet_executor is not None:
+    _gsheet_executor.shutdown(wait=False)
+  _gsheet_executor = None
+
+
 def get_creds():
-  GSHEET_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-  prefix = "GOOGLE_API_"
-  info = {k.replace(prefix, "").lower(): v.replace("\\n", "\n") for k, v in os.environ.items() if k.startswith(prefix)}
-  return service_account.Credentials.from_service_account_info(info, scopes=GSHEET_SCOPES)
+  """Service account credentials, loaded once (their access token is refreshed when it expires)"""
+  global _creds
+  if _creds is None:
+    GSHEET_SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive.metadata.readonly"]
+    prefix = "GOOGLE_API_"
+    info = {k.replace(prefix, "").lower(): v.replace("\\n", "\n") for k, v in os.environ.items() if k.startswith(prefix)}
+    _creds = service_account.Credentials.from_service_account_info(info, scopes=GSHEET_SCOPES)
+  return _creds
 
 
 def get_service_name():
@@ -26,8 +87,35 @@ def make_bot_guser_name():
   return f"{sname}@{sname}.iam.gserviceaccount.com"
   
 
+def _get_service(name: str, version: str):
+  """API client of the calling thread, built once per thread"""
+  service = getattr(_services, name, None)
+  if service is None:
+    service = build(name, version, credentials=get_creds())
+    setattr(_services, name, service)
+  return service
+
+
 def get_sheet_service():
-  return build('sheets', 'v4', credentials=get_creds())
+  return _get_service('sheets', 'v4')
+
+
+def get_drive_service():
+  return _get_service('drive', 'v3')
+
+
+def get_sheet_revision_info(id_gsheet):
+  """Returns a string identifying the current revision of a spreadsheet (from its Drive metadata), it changes whenever 
+  the spreadsheet is modified, and whether the last modification was made by the bot"""
+  fields = "modifiedTime,version,lastModifyingUser(me)"
+  metadata = get_drive_service().files().get(fileId=id_gsheet, fields=fields).execute()
+  by_bot = metadata.get("lastModifyingUser", {}).get("me", False)
+  return f"{metadata['version']}@{metadata['modifiedTime']}", by_bot
+
+
+def get_sheet_revision(id_gsheet):
+  """Returns a string identifying the current revision of a spreadsheet (see `get_sheet_revision_info`)"""
+  return get_sheet_revision_info(id_gsheet)[0]
 
 
 def check_sheet(id_gsheet):
@@ -2,6 +2,7 @@ import os
 import csv
 
 from collections import defaultdict
+from db_util.settings import get_cached_guild_locale, get_guild_locale
 from models import GuildSettings
 from pycord18n.extension import I18nExtension, Language
 
@@ -84,14 +85,13 @@ async def get_db_locale(ctx):
   if ctx.guild is None:
     return GuildSettings.DEFAULT_LOCALE
   guild_id = str(ctx.guild.id)
+  locale = get_cached_guild_locale(guild_id)
+  if locale is not None:
+    return locale
 
   async with ctx.bot.db_session_class() as sess:
     async with sess.begin():
-      settings = await sess.get(GuildSettings, guild_id)
-      if settings is None:
-        return GuildSettings.DEFAULT_LOCALE
-      else: 
-        return settings.locale
+      return await get_guild_locale(sess, guild_id)
 
 
 def localized_attr(obj, attr_name):
@@ -0,0 +1,231 @@
+import bisect
+import contextvars
+import logging
+import math
+import os
+import time
+from collections import deque
+from sqlalchemy import event
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RollingHistogram(object):
+  """Histogram with cumulative (Prometheus) bucket counts and a rolling window of the most recent samples
+  (at most `max_samples` observed less than `window` seconds ago) for computing recent quantiles.
+  """
+  def __init__(self, buckets=LATENCY_BUCKETS, window: float=600, max_samples: int=1024) -> None:
+    self.buckets = tuple(sorted(buckets))
+    self.bucket_counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+    self.count = 0
+    self.sum = 0.0
+    self._window = window
+    self._samples = deque(maxlen=max_samples)  # (timestamp, value)
+
+  def observe(self, value: float, now: float=None):
+    self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+    self._samples.append((time.monotonic() if now is None else now, value))
+
+  def recent(self, now: float=None):
+    """Values observed during the rolling window"""
+    threshold = (time.monotonic() if now is None else now) - self._window
+    while len(self._samples) > 0 and self._samples[0][0] < threshold:
+      self._samples.popleft()
+    return [value for _, value in self._samples]
+
+  def summary(self, now: float=None):
+    """Summary of the values observed during the rolling window (see `summarize`)"""
+    return summarize(self.recent(now=now))
+
+
+def summarize(values):
+  """Count, mean, median, 95th percentile and max of a list of values (None if there is no values)"""
+  values = sorted(values)
+  if len(values) == 0:
+    return None
+  quantile = lambda q: values[min(len(values) - 1, math.ceil(q * len(values)) - 1)]
+  return {
+    "count": len(values),
+    "mean": sum(values) / len(values),
+    "p50": quantile(0.5),
+    "p95": quantile(0.95),
+    "max": values[-1]
+  }
+
+
+def _format_labels(labels: tuple, **extra):
+  items = list(labels) + list(extra.items())
+  if len(items) == 0:
+    return ""
+  escape = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+  return "{" + ",".join([f"{k}=\"{escape(v)}\"" for k, v in items]) + "}"
+
+
+class MetricsRegistry(object):
+  """Labelled rolling histograms and gauge collectors, rendered in the Prometheus text exposition format"""
+  def __init__(self, window: float=600) -> None:
+    self._window = window
+    self._histograms = dict()  # name => (description, buckets, {sorted labels tuple => histogram})
+    self._collectors = list()
+
+  def histogram(self, name: str, description: str, buckets=LATENCY_BUCKETS):
+    """Declares a histogram"""
+    self._histograms.setdefault(name, (description, buckets, dict()))
+
+  def observe(self, name: str, value: float, **labels):
+    _, buckets, histograms = self._histograms[name]
+    key = tuple(sorted(labels.items()))
+    if key not in histograms:
+      histograms[key] = RollingHistogram(buckets=buckets, window=self._window)
+    histograms[key].observe(value)
+
+  def histograms(self, name: str):
+    """Maps the label dictionaries (as sorted tuples) of a histogram with their RollingHistogram"""
+    return self._histograms[name][2]
+
+  def summaries(self, name: str, by: str=None, now: float=None):
+    """Summaries of the values of a histogram observed during the rolling window, grouped by the value of the label `by` 
+    (all values grouped under None if `by` is None). Groups without recent values are omitted."""
+    grouped = dict()
+    for labels, histogram in self.histograms(name).items():
+      key = dict(labels).get(by) if by is not None else None
+      grouped.setdefault(key, list()).extend(histogram.recent(now=now))
+    summaries = {key: summarize(values) for key, values in grouped.items()}
+    return {key: summary for key, summary in summaries.items() if summary is not None}
+
+  @property
+  def window(self):
+    return self._window
+
+  def add_collector(self, collector):
+    """Registers a callable returning a list of (name, description, value, labels) gauges, evaluated at render time"""
+    self._collectors.append(collector)
+
+  def render(self):
+    lines = list()
+    for name, (description, buckets, histograms) in self._histograms.items():
+      lines.append(f"# HELP {name} {description}")
+      lines.append(f"# TYPE {name} histogram")
+      for labels, histogram in histograms.items():
+        cumulated = 0
+        for bound, count in zip(list(buckets) + ["+Inf"], histogram.bucket_counts):
+          cumulated += count
+          lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {cumulated}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    described = set()
+    for collector in self._collectors:
+      try:
+        gauges = collector()
+      except Exception as e:
+        logging.getLogger().error(f"cannot collect metrics: {str(e)}")
+        continue
+      for name, description, value, labels in gauges:
+        if name not in described:
+          lines.append(f"# HELP {name} {description}")
+          lines.append(f"# TYPE {name} gauge")
+          described.add(name)
+        lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry(window=float(os.getenv("METRICS_WINDOW", "600")))
+_registry.histogram("gci_command_duration_seconds", "Duration of the application commands.")
+_registry.histogram("gci_command_queries", "Number of SQL statements executed by an application command.", buckets=COUNT_BUCKETS)
+_registry.histogram("gci_command_query_duration_seconds", "Time spent executing SQL statements by an application command.")
+_registry.histogram("gci_db_query_duration_seconds", "Duration of the SQL statements.")
+_registry.histogram("gci_gsheet_call_duration_seconds", "Duration of the Google Sheets calls (including thread pool wait).")
+_registry.histogram("gci_raid_helper_request_duration_seconds", "Duration of the raid-helper API requests.")
+
+
+def get_metrics_registry():
+  return _registry
+
+
+def observe(name: str, value: float, **labels):
+  _registry.observe(name, value, **labels)
+
+
+class CommandTimer(object):
+  """Duration and SQL statements of the running command"""
+  def __init__(self, name: str) -> None:
+    self.name = name
+    self.start = time.perf_counter()
+    self.queries = 0
+    self.query_duration = 0.0
+
+
+_current_command = contextvars.ContextVar("gci_current_command", default=None)
+
+
+def current_command_name():
+  timer = _current_command.get()
+  return "none" if timer is None else timer.name
+
+
+async def before_command(ctx):
+  """Bot-wide before invoke hook starting the command timer"""
+  _current_command.set(CommandTimer(ctx.command.qualified_name))
+
+
+async def after_command(ctx):
+  """Bot-wide after invoke hook (also called when the command fails) recording the command metrics"""
+  timer = _current_command.get()
+  if timer is None:
+    return
+  _current_command.set(None)
+  observe("gci_command_duration_seconds", time.perf_counter() - timer.start, command=timer.name)
+  observe("gci_command_queries", timer.queries, command=timer.name)
+  observe("gci_command_query_duration_seconds", timer.query_duration, command=timer.name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault("gci_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  starts = conn.info.get("gci_query_start")
+  if not starts:
+    return
+  duration = time.perf_counter() - starts.pop()
+  timer = _current_command.get()
+  if timer is not None:
+    timer.queries += 1
+    timer.query_duration += duration
+  observe("gci_db_query_duration_seconds", duration, command=current_command_name())
+
+
+def instrument_engine(engine):
+  """Attributes the SQL statements executed with the (async) engine to the running command"""
+  event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+  event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+async def start_metrics_server():
+  """Serves the metrics in the Prometheus text format on `METRICS_HOST`:`METRICS_PORT`/metrics (disabled if the port is 0).
+  Returns the server runner (to clean up on shutdown) or None if the server is disabled."""
+  from aiohttp import web
+  port = int(os.getenv("METRICS_PORT", "9108"))
+  if port == 0:
+    return None
+
+  async def handle_metrics(request):
+    return web.Response(body=_registry.render().encode("utf-8"), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+  app = web.Application()
+  app.router.add_get("/metrics", handle_metrics)
+  runner = web.AppRunner(app, access_log=None)
+  await runner.setup()
+  try:
+    await web.TCPSite(runner, os.getenv("METRICS_HOST", "127.0.0.1"), port).start()
+  except OSError as e:
+    logging.getLogger().error(f"cannot start metrics server: {str(e)}")
+    await runner.cleanup()
+    return None
+  logging.getLogger().info(f"Metrics served on port {port}.")
+  return runner
\ No newline at end of file
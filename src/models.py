@@ -1,13 +1,13 @@
 from unicodedata import name
 import pytz
 import datetime
-from sqlalchemy import Column, JSON, Boolean, Enum, Integer, DateTime, String, ForeignKey, UniqueConstraint
+from sqlalchemy import DDL, event, BigInteger, Column, JSON, Boolean, LargeBinary, Enum, Index, Integer, DateTime, String, ForeignKey, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.dialects import postgresql
 
 
-from db_util.wow_data import MainStatusEnum, ProfessionEnum, RaidSizeEnum, RoleEnum, ClassEnum, SpecEnum
+from db_util.wow_data import DkpEventTypeEnum, MainStatusEnum, ProfessionEnum, RaidSizeEnum, RoleEnum, ClassEnum, SpecEnum
 
 Base = declarative_base()
 
@@ -81,10 +81,15 @@ class Attendance(Base):
   cancelled = Column(Boolean)  # if user cancelled his attendance post-registration (on a raid helper for instance)
   is_guild_event = Column(Boolean, default=False, nullable=False)
   in_dkp = Column(Boolean, default=True, nullable=False)
+  reset_index = Column(Integer, nullable=True)  # number of resets of the raid between its first reset and raid_datetime
   
   character = relationship("Character", lazy="joined")
   raid = relationship("Raid", lazy="joined")
 
+  __table_args__ = (
+    Index("attendance_character_raid_size_reset_index", "id_character", "id_raid", "raid_size", "reset_index"),
+  )
+
 
 class Item(Base):
   __tablename__ = "item"
@@ -92,11 +97,40 @@ class Item(Base):
   name_en = Column(String(255))
   name_fr = Column(String(255))
   metadata_ = Column("metadata", postgresql.JSON)
+  # denormalized from metadata
+  inventory_type = Column(Integer, index=True)
+  item_level = Column(Integer, index=True)
+  max_count = Column(Integer)
+  flags = Column(BigInteger)
+
+  __table_args__ = (
+    Index("item_name_en_trgm_index", "name_en", postgresql_using="gin", postgresql_ops={"name_en": "gin_trgm_ops"}),
+    Index("item_name_fr_trgm_index", "name_fr", postgresql_using="gin", postgresql_ops={"name_fr": "gin_trgm_ops"}),
+  )
 
   @property
   def name(self):
     return self.name_en
 
+  @staticmethod
+  def metadata_columns(metadata):
+    """Values of the columns denormalized from the metadata"""
+    as_int = lambda v: None if v is None else int(v)
+    return {
+      "inventory_type": as_int(metadata.get("InventoryType")),
+      "item_level": as_int(metadata.get("ItemLevel")),
+      "max_count": as_int(metadata.get("maxcount")),
+      "flags": as_int(metadata.get("Flags"))
+    }
+
+  @validates("metadata_")
+  def _validate_metadata(self, key, metadata):
+    """Keeps the denormalized columns in sync with the metadata"""
+    if metadata is not None:
+      for column, value in self.metadata_columns(metadata).items():
+        setattr(self, column, value)
+    return metadata
+
 
 class Recipe(Base):
   __tablename__ = "recipe"
@@ -106,6 +140,15 @@ class Recipe(Base):
   metadata_ = Column("metadata", postgresql.JSON)
   profession = Column(Enum(ProfessionEnum))
 
+  __table_args__ = (
+    Index("recipe_name_en_trgm_index", "name_en", postgresql_using="gin", postgresql_ops={"name_en": "gin_trgm_ops"}),
+    Index("recipe_name_fr_trgm_index", "name_fr", postgresql_using="gin", postgresql_ops={"name_fr": "gin_trgm_ops"}),
+  )
+
+
+# trigram indexes (see Item and Recipe) require the pg_trgm extension 
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 
 class UserRecipe(Base):
   __tablename__ = "user_recipe"
@@ -129,6 +172,79 @@ class Loot(Base):
   item = relationship("Item", lazy="joined")
 
 
+class DkpEvent(Base):
+  """One row per event affecting a DKP score"""
+  __tablename__ = "dkp_event"
+  id = Column(Integer, primary_key=True)
+  id_guild = Column(String(22), nullable=False)
+  id_character = Column(Integer, ForeignKey("character.id", ondelete="CASCADE"), nullable=False)
+  event_type = Column(Enum(DkpEventTypeEnum), nullable=False)
+  id_attendance = Column(Integer, ForeignKey("attendance.id", ondelete="CASCADE"), nullable=True)
+  id_loot = Column(Integer, ForeignKey("loot.id", ondelete="CASCADE"), nullable=True)
+  points = Column(Integer, nullable=True)  # None for loots, their cost depends on the item priorities
+  created_at = Column(DateTime, default=utcnow)
+
+  __table_args__ = (
+    Index("dkp_event_guild_type_index", "id_guild", "event_type"),
+    Index("dkp_event_character_created_at_index", "id_character", "created_at"),
+    Index("dkp_event_attendance_index", "id_attendance"),
+    Index("dkp_event_loot_index", "id_loot"),
+  )
+
+
+class DkpSeason(Base):
+  """A DKP season starts at every DKP reset, only DKP events recorded after its start count"""
+  __tablename__ = "dkp_season"
+  id = Column(Integer, primary_key=True)
+  id_guild = Column(String(22), nullable=False)
+  started_at = Column(DateTime, nullable=False, default=utcnow)
+
+  __table_args__ = (
+    Index("dkp_season_guild_started_at_index", "id_guild", "started_at"),
+  )
+
+
+class DkpBalance(Base):
+  """Running sum of the DKP points of a character (loots excluded) for a season"""
+  __tablename__ = "dkp_balance"
+  id_character = Column(Integer, ForeignKey("character.id", ondelete="CASCADE"), primary_key=True)
+  id_guild = Column(String(22), nullable=False, index=True)
+  id_season = Column(Integer, ForeignKey("dkp_season.id", ondelete="SET NULL"), nullable=True)  # None before the first reset
+  raid_points = Column(Integer, nullable=False, default=0)
+  updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+
+class ExportedWorksheet(Base):
+  """State of the last export of a worksheet, used for only sending the rows that changed on the next export"""
+  __tablename__ = "exported_worksheet"
+  id_guild = Column(String(22), primary_key=True)
+  name = Column(String(256), primary_key=True)
+  id_gsheet = Column(String(256), nullable=False)
+  table_hash = Column(String(40), nullable=False)
+  row_hashes = Column(JSON, nullable=False)
+  n_cols = Column(Integer, nullable=False)
+  format_rows = Column(JSON, nullable=True)
+  updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+  @property
+  def state(self):
+    return {
+      "table_hash": self.table_hash,
+      "row_hashes": self.row_hashes,
+      "n_cols": self.n_cols,
+      "format_rows": self.format_rows
+    }
+
+
+class PrioCache(Base):
+  """Raw values of the priority worksheets of a spreadsheet, valid as long as the spreadsheet revision does not change"""
+  __tablename__ = "prio_cache"
+  id_gsheet = Column(String(256), primary_key=True)
+  revision = Column(String(256), nullable=False)
+  data = Column(LargeBinary, nullable=False)
+  updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+
 class GuildCharter(Base):
   __tablename__ = "guild_charter"
 
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+import aiohttp
+from cachetools import TTLCache
+from discord import InvalidArgument
+from metrics import observe
+
+from pycord18n.extension import _ as _t
+
+
+class RaidHelperClient(object):
+  """Asynchronous raid-helper API client: connections are pooled in a shared session, requests have a timeout and 
+  are retried with exponential backoff on network and server errors, and event payloads are cached for `cache_ttl` seconds.
+  """
+  DEFAULT_BASE_URL = "https://raid-helper.dev/api"
+  RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+  def __init__(self, base_url: str=DEFAULT_BASE_URL, timeout: float=10, max_retries: int=3, backoff: float=0.5, 
+               cache_ttl: float=300, cache_size: int=256, pool_size: int=10) -> None:
+    self._base_url = base_url.rstrip("/")
+    self._timeout = aiohttp.ClientTimeout(total=timeout)
+    self._max_retries = max_retries
+    self._backoff = backoff
+    self._pool_size = pool_size
+    self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+    self._session = None
+
+  def _get_session(self):
+    if self._session is None or self._session.closed:
+      connector = aiohttp.TCPConnector(limit=self._pool_size)
+      self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+    return self._session
+
+  async def get_event(self, event_id):
+    """Returns the payload of a raid-helper event (from the cache if it was fetched recently)"""
+    event_id = str(event_id)
+    if event_id in self._cache:
+      return self._cache[event_id]
+    payload = await self._get(f"/event/{event_id}")
+    if payload.get("status", "success") != "failed":
+      self._cache[event_id] = payload
+    return payload
+
+  def invalidate(self, event_id):
+    self._cache.pop(str(event_id), None)
+
+  async def _get(self, path: str):
+    error = None
+    for attempt in range(self._max_retries + 1):
+      if attempt > 0:
+        await asyncio.sleep(self._backoff * 2 ** (attempt - 1))
+      start, status = time.perf_counter(), "error"
+      try:
+        async with self._get_session().get(self._base_url + path) as response:
+          status = response.status
+          if response.status == 404:
+            raise InvalidArgument(_t("attendance.raid_helper.invalid.notfound"))
+          elif response.status == 403:
+            raise InvalidArgument(_t("attendance.raid_helper.invalid.forbidden"))
+          elif response.status in self.RETRY_STATUSES:
+            error = response.status
+            continue
+          elif response.status != 200:
+            raise InvalidArgument(_t("attendance.raid_helper.invalid.http", error=response.status))
+          return await response.json(content_type=None)
+      except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error = e if str(e) else type(e).__name__
+      finally:
+        observe("gci_raid_helper_request_duration_seconds", time.perf_counter() - start, status=status)
+    raise InvalidArgument(_t("attendance.raid_helper.invalid.http", error=error))
+
+  async def close(self):
+    if self._session is not None and not self._session.closed:
+      await self._session.close()
+    self._session = None
+
+
+_raid_helper_client = None
+
+
+def get_raid_helper_client():
+  """Shared raid-helper client, configured by `RAID_HELPER_TIMEOUT`, `RAID_HELPER_RETRIES` and `RAID_HELPER_CACHE_TTL`"""
+  global _raid_helper_client
+  if _raid_helper_client is None:
+    _raid_helper_client = RaidHelperClient(
+      timeout=float(os.getenv("RAID_HELPER_TIMEOUT", "10")),
+      max_retries=int(os.getenv("RAID_HELPER_RETRIES", "3")),
+      cache_ttl=float(os.getenv("RAID_HELPER_CACHE_TTL", "300"))
+    )
+  return _raid_helper_client
+
+
+async def close_raid_helper_client():
+  global _raid_helper_client
+  if _raid_helper_client is not None:
+    await _raid_helper_client.close()
+  _raid_helper_client = None
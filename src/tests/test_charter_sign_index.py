@@ -0,0 +1,30 @@
+from unittest import TestCase
+from discord import PartialEmoji
+from db_util.charter import get_charter_sign_role, update_charter_sign_index
+from models import GuildCharter
+
+
+class TestCharterSignIndex(TestCase):
+  def _charter(self, **kwargs):
+    fields = dict(id_guild="1", id_sign_message="10", sign_emoji="✅", id_sign_role="100", id_sign_channel="5")
+    fields.update(kwargs)
+    return GuildCharter(**fields)
+
+  def tearDown(self):
+    update_charter_sign_index(self._charter(id_sign_message=None))
+
+  def testSignReaction(self):
+    update_charter_sign_index(self._charter())
+    self.assertEqual(get_charter_sign_role("1", "10", PartialEmoji(name="✅")), "100")
+
+  def testUnrelatedReaction(self):
+    update_charter_sign_index(self._charter())
+    self.assertIsNone(get_charter_sign_role("1", "10", PartialEmoji(name="❌")))
+    self.assertIsNone(get_charter_sign_role("1", "11", PartialEmoji(name="✅")))
+    self.assertIsNone(get_charter_sign_role("2", "10", PartialEmoji(name="✅")))
+
+  def testRepublish(self):
+    update_charter_sign_index(self._charter())
+    update_charter_sign_index(self._charter(id_sign_message="20", id_sign_role="200"))
+    self.assertIsNone(get_charter_sign_role("1", "10", PartialEmoji(name="✅")))
+    self.assertEqual(get_charter_sign_role("1", "20", PartialEmoji(name="✅")), "200")
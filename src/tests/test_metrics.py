@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import TestCase
+from sqlalchemy import create_engine, text
+from metrics import MetricsRegistry, RollingHistogram, after_command, before_command, get_metrics_registry, instrument_engine, summarize
+
+
+class TestRollingHistogram(TestCase):
+  def testBuckets(self):
+    histogram = RollingHistogram(buckets=(0.1, 1))
+    for value in [0.05, 0.1, 0.5, 2]:
+      histogram.observe(value)
+    self.assertListEqual(histogram.bucket_counts, [2, 1, 1])
+    self.assertEqual(histogram.count, 4)
+    self.assertAlmostEqual(histogram.sum, 2.65)
+
+  def testRollingWindow(self):
+    histogram = RollingHistogram(window=10)
+    histogram.observe(1, now=0)
+    histogram.observe(2, now=5)
+    histogram.observe(3, now=12)
+    self.assertListEqual(histogram.recent(now=12), [2, 3])
+    self.assertEqual(histogram.summary(now=12)["max"], 3)
+    self.assertIsNone(histogram.summary(now=100))
+    self.assertEqual(histogram.count, 3)
+
+  def testSummarize(self):
+    summary = summarize(list(range(1, 101)))
+    self.assertEqual(summary["p50"], 50)
+    self.assertEqual(summary["p95"], 95)
+    self.assertEqual(summary["mean"], 50.5)
+    self.assertIsNone(summarize([]))
+
+
+class TestMetricsRegistry(TestCase):
+  def setUp(self):
+    self.registry = MetricsRegistry()
+    self.registry.histogram("test_seconds", "Test durations.", buckets=(1,))
+
+  def testRender(self):
+    self.registry.observe("test_seconds", 0.5, command="a")
+    self.registry.observe("test_seconds", 2, command="a")
+    self.registry.add_collector(lambda: [("test_gauge", "Test gauge.", 3, {})])
+    rendered = self.registry.render()
+    self.assertIn("# TYPE test_seconds histogram", rendered)
+    self.assertIn("test_seconds_bucket{command=\"a\",le=\"1\"} 1", rendered)
+    self.assertIn("test_seconds_bucket{command=\"a\",le=\"+Inf\"} 2", rendered)
+    self.assertIn("test_seconds_count{command=\"a\"} 2", rendered)
+    self.assertIn("# TYPE test_gauge gauge\ntest_gauge 3", rendered)
+
+  def testSummariesByLabel(self):
+    self.registry.observe("test_seconds", 1, command="a", status="ok")
+    self.registry.observe("test_seconds", 3, command="a", status="error")
+    self.registry.observe("test_seconds", 2, command="b", status="ok")
+    self.assertEqual(self.registry.summaries("test_seconds", by="command")["a"]["count"], 2)
+    self.assertEqual(self.registry.summaries("test_seconds")[None]["count"], 3)
+
+
+class TestCommandInstrumentation(TestCase):
+  def testQueriesAttributedToCommand(self):
+    engine = SimpleNamespace(sync_engine=create_engine("sqlite://"))
+    instrument_engine(engine)
+    ctx = SimpleNamespace(command=SimpleNamespace(qualified_name="test instrumented"))
+
+    async def command():
+      await before_command(ctx)
+      with engine.sync_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+      await after_command(ctx)
+
+    asyncio.run(command())
+    registry = get_metrics_registry()
+    self.assertEqual(registry.summaries("gci_command_queries", by="command")["test instrumented"]["max"], 2)
+    self.assertEqual(registry.summaries("gci_command_duration_seconds", by="command")["test instrumented"]["count"], 1)
+    self.assertEqual(registry.summaries("gci_db_query_duration_seconds", by="command")["test instrumented"]["count"], 2)
@@ -0,0 +1,67 @@
+from unittest import TestCase
+from db_util.name_index import NameIndex, build_name_indexes, normalize_name
+
+
+class TestNameIndex(TestCase):
+  def setUp(self):
+    self.index = NameIndex()
+    self.index.add(1, ["Thunderfury, Blessed Blade of the Windseeker", "Lame-tonnerre, épée bénie du Cherchevent"])
+    self.index.add(2, ["Shadowmourne", "Deuillelombre"], payload="weapon")
+    self.index.add(3, ["Shadow's Edge", "Lame de l'ombre"], payload="weapon")
+    self.index.add(4, ["Mantle of the Shadows", "Mantelet des ombres"], payload="armor")
+    self.index.freeze()
+
+  def testNormalize(self):
+    self.assertEqual(normalize_name(" Épée Bénie "), "epee benie")
+
+  def testEmptyQuery(self):
+    self.assertListEqual(self.index.search(""), [])
+
+  def testPrefix(self):
+    self.assertListEqual([_id for _id, _ in self.index.search("sh")], [2, 3, 4])
+    self.assertListEqual([_id for _id, _ in self.index.search("de")], [2, 3, 4])
+
+  def testSubstringRanking(self):
+    results = self.index.search("shadow")
+    self.assertListEqual([_id for _id, _ in results], [2, 3, 4])
+    self.assertEqual(results[0][1], "Shadowmourne")
+
+  def testMidWordSubstring(self):
+    self.assertListEqual(self.index.search("mourne"), [(2, "Shadowmourne")])
+
+  def testAccentsAndLocales(self):
+    self.assertListEqual(self.index.search("epee"), [(1, "Lame-tonnerre, épée bénie du Cherchevent")])
+    self.assertListEqual([_id for _id, _ in self.index.search("lame")], [3, 1])
+
+  def testFuzzy(self):
+    self.assertEqual(self.index.search("thunderfurry")[0][0], 1)
+
+  def testAcceptAndLimit(self):
+    self.assertListEqual([_id for _id, _ in self.index.search("shadow", accept=lambda p: p == "weapon")], [2, 3])
+    self.assertEqual(len(self.index.search("shadow", limit=1)), 1)
+
+  def testChoiceIdentifier(self):
+    self.assertEqual(self.index.get_choice_identifier("2"), 2)
+    self.assertIsNone(self.index.get_choice_identifier("42"))
+    self.assertIsNone(self.index.get_choice_identifier("Shadowmourne"))
+    self.assertIsNone(self.index.get_choice_identifier(None))
+
+  def testBuildIndexes(self):
+    item_index, recipe_index = build_name_indexes(
+      [(1, "Shadowmourne", "Deuillelombre"), (2, "Shadow's Edge", None)],
+      [(3, "Mantle of the Shadows", "Mantelet des ombres", "tailoring")]
+    )
+    self.assertListEqual([_id for _id, _ in item_index.search("shadow")], [1, 2])
+    self.assertListEqual(recipe_index.search("ombres", accept=lambda p: p == "tailoring"), [(3, "Mantelet des ombres")])
+    self.assertListEqual(recipe_index.search("ombres", accept=lambda p: p == "cooking"), [])
+
+  def testLargeIndex(self):
+    index = NameIndex()
+    for i in range(40000):
+      index.add(i, [f"Item number {i} of the shadow realm", f"Objet numero {i} du royaume"])
+    index.freeze()
+    self.assertEqual(len(index.search("it")), 25)
+    self.assertEqual(len(index.search("sha", limit=5)), 5)
+    self.assertEqual(index.search("objet numero 3999")[0], (3999, "Objet numero 3999 du royaume"))
+    self.assertSetEqual({_id for _id, _ in index.search("number 1234 of")}, {1234})
+    self.assertTrue(all(name.startswith("Item number 123") for _, name in index.search("number 123")))
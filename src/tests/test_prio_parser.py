@@ -0,0 +1,161 @@
+import asyncio
+import json
+from unittest import TestCase
+from db_util.priorities import PrioTierEnum
+from db_util.wow_data import ClassEnum, RoleEnum
+from gsheet import prio_cache
+from gsheet.parse_priorities import PrioParser
+from gsheet.prio_cache import SheetRevisionTracker, restamp_prio_cache
+from models import PrioCache
+
+
+class FakeWorksheet(object):
+  def __init__(self, title, values):
+    self.title = title
+    self.values = values
+
+
+class FakeSheetAPI(object):
+  def __init__(self, worksheets):
+    self._worksheets = {ws.title: ws for ws in worksheets}
+    self.calls = 0
+
+  def values_batch_get(self, spreadsheet_id, value_ranges):
+    self.calls += 1
+    return [{"range": r, "values": self._worksheets[r.strip("'")].values} for r in value_ranges]
+
+
+class FakeClient(object):
+  def __init__(self, worksheets):
+    self.sheet = FakeSheetAPI(worksheets)
+
+
+class FakeSpreadsheet(object):
+  def __init__(self, worksheets):
+    self.id = "fake"
+    self.client = FakeClient(worksheets)
+    self._worksheets = worksheets
+
+  def worksheets(self):
+    return self._worksheets
+
+
+CONFIG_ROLES = [
+  ["class", "role", "spec", "name"],
+  ["PALADIN", "MELEE_DPS", "", "palret"],
+  ["WARRIOR", "TANK", "", "wartank"]
+]
+PRIO_HEADERS = ["id", "name", "ilvl", "boss", "phase", "comment"]
+
+PALRET = (ClassEnum.PALADIN, RoleEnum.MELEE_DPS, None)
+
+
+class TestPrioParserCache(TestCase):
+  def setUp(self):
+    self.sheet = FakeSpreadsheet([
+      FakeWorksheet("config_roles", CONFIG_ROLES),
+      FakeWorksheet("prio_p1", [
+        PRIO_HEADERS,
+        ["1", "sword", "200", "boss", "1", "", "", "palret", ">", "wartank"],
+        ["2", "shield", "200", "boss", "1", "", "", "wartank"],
+        ["", "sword", "200"],
+        ["3", "axe", "200", "boss", "1", "", "", "unknown"],
+      ]),
+      FakeWorksheet("other", [["id"], ["4"]])
+    ])
+
+  def testParse(self):
+    parser = PrioParser(self.sheet)
+    self.assertEqual(self.sheet.client.sheet.calls, 1)
+    self.assertSetEqual(set(parser.items.keys()), {1, 2})
+    self.assertEqual(len(parser.errors), 1)
+    self.assertEqual(parser[1].priority_list.get_priority_tier(PALRET), PrioTierEnum.IS_BIS)
+
+  def testCacheRoundTrip(self):
+    parser = PrioParser(self.sheet)
+    cached = PrioParser.from_cache(self.sheet, parser.to_cache())
+    self.assertEqual(self.sheet.client.sheet.calls, 1)
+    self.assertSetEqual(set(cached.items.keys()), set(parser.items.keys()))
+    self.assertDictEqual(cached.name2role, parser.name2role)
+    self.assertDictEqual(cached._role2name, parser._role2name)
+    self.assertEqual(cached[1].metadata, parser[1].metadata)
+    self.assertEqual(cached[1].priority_list.get_priority_tier(PALRET), PrioTierEnum.IS_BIS)
+    self.assertEqual(cached[2].priority_list.get_priority_tier(PALRET), PrioTierEnum.IS_USELESS)
+    self.assertListEqual([str(error) for error in cached.errors], [str(error) for error in parser.errors])
+
+  def testCacheMiss(self):
+    data = PrioParser(self.sheet).to_cache()
+    self.assertIsNone(PrioParser.from_cache(self.sheet, b"\x80\x04not json"))
+    self.assertIsNone(PrioParser.from_cache(self.sheet, json.dumps({"version": 0, "titles": ["prio_p1"], "values": []}).encode("utf-8")))
+    self.sheet._worksheets.append(FakeWorksheet("prio_p2", [PRIO_HEADERS]))
+    self.assertIsNone(PrioParser.from_cache(self.sheet, data))
+
+
+class FakeSession(object):
+  def __init__(self, entry):
+    self.entry = entry
+    self.deleted = list()
+
+  async def get(self, model, key):
+    return self.entry
+
+  async def delete(self, instance):
+    self.deleted.append(instance)
+
+
+class TestRevisionTracking(TestCase):
+  def setUp(self):
+    self._run_in_gsheet_pool = prio_cache.run_in_gsheet_pool
+    self.revisions = list()
+
+    async def next_revision(fn, *args, **kwargs):
+      return self.revisions.pop(0)
+    prio_cache.run_in_gsheet_pool = next_revision
+    prio_cache._prio_parsers["fake"] = ("1", None)
+    self.entry = PrioCache(id_gsheet="fake", revision="1", data=b"")
+    self.sess = FakeSession(self.entry)
+
+  def tearDown(self):
+    prio_cache.run_in_gsheet_pool = self._run_in_gsheet_pool
+    prio_cache._prio_parsers.pop("fake", None)
+
+  def _export(self, tracker, writes):
+    """`writes` tells for each worksheet whether it was actually written"""
+    async def export():
+      for written in writes:
+        await tracker.before_write()
+        await tracker.after_write(written=written)
+      await restamp_prio_cache(self.sess, tracker)
+    asyncio.run(export())
+
+  def _assertInvalidated(self, tracker):
+    self.assertTrue(tracker.foreign_edit)
+    self.assertListEqual(self.sess.deleted, [self.entry])
+    self.assertNotIn("fake", prio_cache._prio_parsers)
+
+  def testRestampOwnWrites(self):
+    # revision before each write, (revision, last modified by the bot) after each actual write
+    self.revisions = ["1", ("2", True), "2", "2", ("3", True)]
+    tracker = SheetRevisionTracker("fake", "1")
+    self._export(tracker, [True, False, True])
+    self.assertFalse(tracker.foreign_edit)
+    self.assertEqual(self.entry.revision, "3")
+    self.assertEqual(prio_cache._prio_parsers["fake"][0], "3")
+
+  def testInvalidateOnForeignEdit(self):
+    self.revisions = ["1", ("2", True), "4"]  # edited by someone else between the writes
+    tracker = SheetRevisionTracker("fake", "1")
+    self._export(tracker, [True, True])
+    self._assertInvalidated(tracker)
+
+  def testInvalidateOnForeignEditDuringWrite(self):
+    self.revisions = ["1", ("3", False)]  # edited by someone else after the write
+    tracker = SheetRevisionTracker("fake", "1")
+    self._export(tracker, [True])
+    self._assertInvalidated(tracker)
+
+  def testInvalidateOnUnchangedRevisionAfterWrite(self):
+    self.revisions = ["1", ("1", True)]
+    tracker = SheetRevisionTracker("fake", "1")
+    self._export(tracker, [True])
+    self._assertInvalidated(tracker)
@@ -0,0 +1,83 @@
+import os
+import timeit
+from unittest import TestCase, skipUnless
+from db_util.priorities import PriorityList, PrioTierEnum
+from db_util.wow_data import ClassEnum, RoleEnum, is_valid_class_role
+
+
+def all_role_tuples():
+  roles = list()
+  for character_class in ClassEnum:
+    for role in RoleEnum:
+      if not is_valid_class_role(character_class, role):
+        continue
+      roles.append((character_class, role, None))
+      roles.extend([(character_class, role, spec) for spec in character_class.get_specs(role)])
+  return roles
+
+
+def realistic_prio_array(roles):
+  """Roughly 2/3 of the roles spread over the tiers, with several sublevels per tier"""
+  array = list()
+  listed = roles[:2 * len(roles) // 3]
+  tier_size = len(listed) // 4
+  for tier_index in range(4):
+    tier_roles = listed[tier_index * tier_size:(tier_index + 1) * tier_size]
+    for i, role in enumerate(tier_roles):
+      if i > 0:
+        array.append(">" if i % 2 == 0 else "~")
+      array.append(role)
+    if tier_index < 3:
+      array.append(">>")
+  return array
+
+
+def scan_priority_tier(plist: PriorityList, query: tuple):
+  """Reference lookup walking every tier and sublevel"""
+  for tier in PrioTierEnum.useful_tiers():
+    for sublevel in plist.get_for_tier(tier):
+      if query in sublevel:
+        return tier
+  return PrioTierEnum.IS_USELESS
+
+
+def scan_cmp(plist: PriorityList, query1: tuple, query2: tuple):
+  """Reference comparison walking every tier and sublevel"""
+  prio1, prio2 = scan_priority_tier(plist, query1), scan_priority_tier(plist, query2)
+  if prio1 != prio2:
+    return prio2.value - prio1.value
+  index1, index2 = None, None
+  for i, sublevel in enumerate(plist.get_for_tier(prio1)):
+    if query1 in sublevel:
+      index1 = i
+    if query2 in sublevel:
+      index2 = i
+  return index2 - index1
+
+
+class TestPriorityListBenchmark(TestCase):
+  def setUp(self):
+    self._roles = all_role_tuples()
+    self._plist = PriorityList(realistic_prio_array(self._roles))
+    self._listed = [r for r in self._roles if self._plist.get_priority_tier(r) != PrioTierEnum.IS_USELESS]
+
+  def testIndexMatchesScan(self):
+    for role in self._roles:
+      self.assertEqual(self._plist.get_priority_tier(role), scan_priority_tier(self._plist, role))
+    for role1 in self._listed:
+      for role2 in self._listed:
+        self.assertEqual(self._plist.cmp(role1, role2), scan_cmp(self._plist, role1, role2))
+
+
+  @skipUnless(os.getenv("RUN_BENCHMARKS") == "1", "set RUN_BENCHMARKS=1 to run the benchmarks")
+  def testIndexSpeedup(self):
+    """Prints the timings of the indexed lookups against the scans (no assertion, timings depend on the machine)"""
+    number = 200
+    index_time = timeit.timeit(lambda: [self._plist.get_priority_tier(r) for r in self._roles], number=number)
+    scan_time = timeit.timeit(lambda: [scan_priority_tier(self._plist, r) for r in self._roles], number=number)
+    index_cmp_time = timeit.timeit(lambda: [self._plist.cmp(r1, r2) for r1 in self._listed for r2 in self._listed], number=number // 10)
+    scan_cmp_time = timeit.timeit(lambda: [scan_cmp(self._plist, r1, r2) for r1 in self._listed for r2 in self._listed], number=number // 10)
+    print(
+      f"\nget_priority_tier: index {index_time:.4f}s vs scan {scan_time:.4f}s (x{scan_time / index_time:.1f})"
+      f"\ncmp: index {index_cmp_time:.4f}s vs scan {scan_cmp_time:.4f}s (x{scan_cmp_time / index_cmp_time:.1f})"
+    )
@@ -0,0 +1,38 @@
+import asyncio
+import datetime
+from unittest import TestCase
+from discord import InvalidArgument
+from db_util import raid as raid_util
+from db_util.raid import RaidCatalog, get_raid, get_raids
+from lang.util import build_i18n
+from models import Raid
+
+
+class TestRaidCatalog(TestCase):
+  def setUp(self):
+    self._i18n = build_i18n("./src/lang")
+    self.now = datetime.datetime(2026, 10, 18, 12)
+    self.raids = [
+      Raid(id=2, name_en="Ulduar", open_at=self.now + datetime.timedelta(days=7), reset_period=7),
+      Raid(id=1, name_en="Naxxramas", open_at=self.now - datetime.timedelta(days=30), reset_period=7),
+    ]
+    self.catalog = RaidCatalog(self.raids)
+
+  def tearDown(self):
+    raid_util._raid_catalog = None
+
+  def testGet(self):
+    self.assertEqual(self.catalog.get(2).name_en, "Ulduar")
+    self.assertIsNone(self.catalog.get(3))
+
+  def testOpenRaids(self):
+    self.assertListEqual([raid.id for raid in self.catalog.raids()], [1, 2])
+    self.assertListEqual([raid.id for raid in self.catalog.raids(open_only=True, when=self.now)], [1])
+    self.assertListEqual([raid.id for raid in self.catalog.raids(open_only=True, when=self.now + datetime.timedelta(days=7))], [1, 2])
+
+  def testLoadedCatalogDoesNotQuery(self):
+    raid_util._raid_catalog = self.catalog
+    self.assertEqual(asyncio.run(get_raid(None, 1)).name_en, "Naxxramas")
+    self.assertEqual(len(asyncio.run(get_raids(None))), 2)
+    with self.assertRaises(InvalidArgument):
+      asyncio.run(get_raid(None, 3))
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from aiohttp import web
+from discord import InvalidArgument
+from lang.util import build_i18n
+from raid_helper_client import RaidHelperClient
+
+
+class StubRaidHelperServer(object):
+  """Local raid-helper API stub, each event id is mapped with the list of responses (status, payload) to return in turn"""
+  def __init__(self, responses: dict, delay: float=0):
+    self._responses = responses
+    self._delay = delay
+    self.hits = 0
+    self._runner = None
+    self.url = None
+
+  async def _handle_event(self, request):
+    self.hits += 1
+    if self._delay > 0:
+      await asyncio.sleep(self._delay)
+    responses = self._responses[request.match_info["event_id"]]
+    status, payload = responses.pop(0) if len(responses) > 1 else responses[0]
+    return web.json_response(payload, status=status)
+
+  async def start(self):
+    app = web.Application()
+    app.router.add_get("/api/event/{event_id}", self._handle_event)
+    self._runner = web.AppRunner(app)
+    await self._runner.setup()
+    site = web.TCPSite(self._runner, "127.0.0.1", 0)
+    await site.start()
+    port = self._runner.addresses[0][1]
+    self.url = f"http://127.0.0.1:{port}/api"
+
+  async def stop(self):
+    await self._runner.cleanup()
+
+
+EVENT = {"date": "01-01-2023", "time": "20:00", "signups": []}
+
+
+class TestRaidHelperClient(unittest.IsolatedAsyncioTestCase):
+  def setUp(self):
+    self._i18n = build_i18n("./src/lang")
+
+  async def make_client(self, responses, delay=0, **kwargs):
+    server = StubRaidHelperServer(responses, delay=delay)
+    await server.start()
+    client = RaidHelperClient(base_url=server.url, backoff=0.01, **kwargs)
+    self.addAsyncCleanup(server.stop)
+    self.addAsyncCleanup(client.close)
+    return server, client
+
+  async def testGetEventIsCached(self):
+    server, client = await self.make_client({"1": [(200, EVENT)]})
+    self.assertDictEqual(await client.get_event(1), EVENT)
+    self.assertDictEqual(await client.get_event("1"), EVENT)
+    self.assertEqual(server.hits, 1)
+    client.invalidate(1)
+    await client.get_event(1)
+    self.assertEqual(server.hits, 2)
+
+  async def testCacheExpires(self):
+    server, client = await self.make_client({"1": [(200, EVENT)]}, cache_ttl=0.05)
+    await client.get_event(1)
+    await asyncio.sleep(0.1)
+    await client.get_event(1)
+    self.assertEqual(server.hits, 2)
+
+  async def testFailedEventIsNotCached(self):
+    server, client = await self.make_client({"1": [(200, {"status": "failed"})]})
+    await client.get_event(1)
+    await client.get_event(1)
+    self.assertEqual(server.hits, 2)
+
+  async def testRetryOnServerError(self):
+    server, client = await self.make_client({"1": [(500, {}), (503, {}), (200, EVENT)]}, max_retries=3)
+    self.assertDictEqual(await client.get_event(1), EVENT)
+    self.assertEqual(server.hits, 3)
+
+  async def testRetriesExhausted(self):
+    server, client = await self.make_client({"1": [(500, {})]}, max_retries=2)
+    with self.assertRaises(InvalidArgument):
+      await client.get_event(1)
+    self.assertEqual(server.hits, 3)
+
+  async def testNotFoundIsNotRetried(self):
+    server, client = await self.make_client({"1": [(404, {})]}, max_retries=3)
+    with self.assertRaises(InvalidArgument):
+      await client.get_event(1)
+    self.assertEqual(server.hits, 1)
+
+  async def testTimeout(self):
+    server, client = await self.make_client({"1": [(200, EVENT)]}, delay=0.5, timeout=0.05, max_retries=1)
+    with self.assertRaises(InvalidArgument):
+      await client.get_event(1)
+    self.assertEqual(server.hits, 2)
@@ -0,0 +1,27 @@
+import datetime
+from unittest import TestCase
+from db_util.attendance import get_reset_ranges
+from models import Raid
+
+
+class TestResetRanges(TestCase):
+  def setUp(self):
+    self.start = datetime.datetime(2026, 10, 7, 9)
+    self.raids = [
+      Raid(id=1, reset_start=self.start, reset_period=7),
+      Raid(id=2, reset_start=self.start + datetime.timedelta(days=14), reset_period=7),
+      Raid(id=3, reset_start=self.start + datetime.timedelta(days=60), reset_period=3),
+    ]
+
+  def testRanges(self):
+    ranges = get_reset_ranges(self.raids, self.start + datetime.timedelta(days=7), self.start + datetime.timedelta(days=20))
+    self.assertDictEqual(ranges, {1: (1, 2), 2: (0, 0)})
+
+  def testRaidStartingInRange(self):
+    ranges = get_reset_ranges(self.raids, self.start - datetime.timedelta(days=30), self.start + datetime.timedelta(days=20))
+    self.assertEqual(ranges[1], (0, 2))
+    self.assertEqual(ranges[2], (0, 0))
+
+  def testRaidStartingAfterRange(self):
+    ranges = get_reset_ranges(self.raids, self.start - datetime.timedelta(days=30), self.start - datetime.timedelta(days=1))
+    self.assertDictEqual(ranges, {})
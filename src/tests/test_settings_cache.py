@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import TestCase
+from db_util import settings as settings_cache
+from db_util.settings import get_cached_guild_locale, get_guild_locale, get_guild_settings, get_settings_cache_stats, invalidate_guild_settings
+from lang.util import get_db_locale
+from models import GuildSettings
+
+
+class FakeSession(object):
+  def __init__(self, settings):
+    self.settings = {s.id_guild: s for s in settings}
+    self.gets = 0
+
+  async def get(self, model, id_guild):
+    self.gets += 1
+    return self.settings.get(id_guild)
+
+  def expunge(self, instance):
+    pass
+
+
+class TestSettingsCache(TestCase):
+  def setUp(self):
+    settings_cache._settings_cache = None
+    self.sess = FakeSession([GuildSettings(id_guild="1", locale="fr")])
+
+  def _run(self, coroutine):
+    return asyncio.run(coroutine)
+
+  def testCached(self):
+    stats = get_settings_cache_stats()
+    self.assertEqual(self._run(get_guild_locale(self.sess, "1")), "fr")
+    self.assertEqual(self._run(get_guild_settings(self.sess, "1")).locale, "fr")
+    self.assertEqual(self.sess.gets, 1)
+    after = get_settings_cache_stats()
+    self.assertEqual(after["misses"] - stats["misses"], 1)
+    self.assertEqual(after["hits"] - stats["hits"], 1)
+
+  def testMissingSettingsCached(self):
+    self.assertEqual(self._run(get_guild_locale(self.sess, "2")), GuildSettings.DEFAULT_LOCALE)
+    self.assertIsNone(self._run(get_guild_settings(self.sess, "2")))
+    self.assertEqual(self.sess.gets, 1)
+
+  def testInvalidate(self):
+    self._run(get_guild_settings(self.sess, "1"))
+    self.sess.settings["1"] = GuildSettings(id_guild="1", locale="en")
+    invalidate_guild_settings("1")
+    self.assertEqual(self._run(get_guild_locale(self.sess, "1")), "en")
+    self.assertEqual(self.sess.gets, 2)
+
+
+  def testCachedLocaleWithoutSession(self):
+    self.assertIsNone(get_cached_guild_locale("1"))
+    self._run(get_guild_settings(self.sess, "1"))
+    self._run(get_guild_settings(self.sess, "2"))
+    self.assertEqual(get_cached_guild_locale("1"), "fr")
+    self.assertEqual(get_cached_guild_locale("2"), GuildSettings.DEFAULT_LOCALE)
+    self.assertEqual(self.sess.gets, 2)
+
+  def testDbLocaleCacheHitWithoutSession(self):
+    self._run(get_guild_settings(self.sess, "1"))
+    def no_session():
+      raise AssertionError("session opened on cache hit")
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=1), bot=SimpleNamespace(db_session_class=no_session))
+    self.assertEqual(self._run(get_db_locale(ctx)), "fr")
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from gsheet.export import update_changed_rows
+from gsheet.worksheet_diff import changed_row_ranges, column_label, pad_row, table_state
+
+
+class FakeSheetService(object):
+  """Records the values batchUpdate bodies"""
+  def __init__(self):
+    self.bodies = list()
+
+  def spreadsheets(self):
+    return self
+
+  def values(self):
+    return self
+
+  def batchUpdate(self, spreadsheetId, body):
+    self.bodies.append(body)
+    return SimpleNamespace(execute=lambda: None)
+
+
+class TestWorksheetDiff(TestCase):
+  def testTableStateHash(self):
+    table = [["id", "name"], [1, "Arthas"], [2, "Jaina"]]
+    self.assertEqual(table_state(table)["table_hash"], table_state([list(row) for row in table])["table_hash"])
+    self.assertNotEqual(table_state(table)["table_hash"], table_state(table[:2])["table_hash"])
+    self.assertEqual(table_state(table)["n_cols"], 2)
+    self.assertIsNone(table_state(table)["format_rows"])
+    self.assertListEqual(table_state(table, format_rows=[2])["format_rows"], [2])
+
+  def testChangedRowRangesUnchanged(self):
+    self.assertListEqual(changed_row_ranges(["a", "b", "c"], ["a", "b", "c"]), [])
+    self.assertListEqual(changed_row_ranges([], []), [])
+
+  def testChangedRowRanges(self):
+    self.assertListEqual(changed_row_ranges(["a", "b", "c", "d"], ["a", "x", "c", "y"]), [(1, 2), (3, 4)])
+    self.assertListEqual(changed_row_ranges(["a", "b", "c"], ["a", "x", "y"]), [(1, 3)])
+
+  def testChangedRowRangesAddedRemoved(self):
+    self.assertListEqual(changed_row_ranges(["a", "b"], ["a", "b", "c", "d"]), [(2, 4)])
+    self.assertListEqual(changed_row_ranges(["a", "b", "c", "d"], ["a", "x"]), [(1, 4)])
+    self.assertListEqual(changed_row_ranges([], ["a"]), [(0, 1)])
+
+  def testColumnLabel(self):
+    self.assertEqual(column_label(1), "A")
+    self.assertEqual(column_label(26), "Z")
+    self.assertEqual(column_label(27), "AA")
+    self.assertEqual(column_label(28), "AB")
+    self.assertEqual(column_label(52), "AZ")
+    self.assertEqual(column_label(53), "BA")
+
+  def testPadRow(self):
+    self.assertListEqual(pad_row([1, None], 4), [1, "", "", ""])
+    self.assertListEqual(pad_row([], 2), ["", ""])
+
+
+  def testUpdateChangedRowsGrowsGrid(self):
+    previous = [["id", "name"], [1, "Arthas"]]
+    table = [["id", "name", "class"], [1, "Arthas", "dk"], [2, "Jaina", "mage"]]
+    worksheet = SimpleNamespace(title="dkp", rows=3, cols=2)
+    service = FakeSheetService()
+    with patch("gsheet.export.get_sheet_service", return_value=service):
+      update_changed_rows(SimpleNamespace(id="sheet"), worksheet, table, table_state(previous), table_state(table))
+    self.assertEqual(worksheet.cols, 3)
+    self.assertEqual(worksheet.rows, 4)
+    self.assertListEqual([d["range"] for d in service.bodies[0]["data"]], ["'dkp'!A1:C3"])
+
+  def testUpdateChangedRowsKeepsLargerGrid(self):
+    previous = [["id", "name", "class"], [1, "Arthas", "dk"]]
+    table = [["id", "name"], [1, "Jaina"]]
+    worksheet = SimpleNamespace(title="dkp", rows=10, cols=5)
+    service = FakeSheetService()
+    with patch("gsheet.export.get_sheet_service", return_value=service):
+      update_changed_rows(SimpleNamespace(id="sheet"), worksheet, table, table_state(previous), table_state(table))
+    self.assertEqual((worksheet.rows, worksheet.cols), (10, 5))
+    self.assertListEqual(service.bodies[0]["data"], [{"range": "'dkp'!A1:C2", "values": [["id", "name", ""], [1, "Jaina", ""]]}])
@@ -29,6 +29,28 @@ class CharacterAttendanceEmbed(Embed):
     self.add_field(name=_t("attendance.report.raids"), value=field_value)
 
 
+class GuildAttendanceEmbed(Embed):
+  MAX_DESC_LENGTH = 4096
+
+  def __init__(self, resets, rows, datetime_range: tuple, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.title = _t("attendance.guild_report.title")
+
+    desc = _t("attendance.report.for_raids_in", _from=datetime_range[0].strftime('%d/%m/%Y'), _to=datetime_range[1].strftime('%d/%m/%Y')) + "\n"
+    if len(rows) == 0:
+      desc += _t("general.no_data")
+    for _, name, counts, total in rows:
+      line = "- " + _t("attendance.guild_report.line", 
+        char_name=name, 
+        n_attended=len([count for count in counts if count > 0]), 
+        n_resets=len(resets), 
+        total=total) + "\n"
+      if len(desc) + len(line) >= self.MAX_DESC_LENGTH:
+        break
+      desc += line
+    self.description = desc
+
+
 class AttendanceRaidSelectView(RaidSelectView):
   def __init__(self, bot, raids, id_character: int, raid_datetime: datetime.datetime, *args, **kwargs) -> None:
     super().__init__(bot, raids, *args, **kwargs)
@@ -12,8 +12,8 @@ from pycord18n.extension import _ as _t
 
 class ItemListEmbed(ListEmbed):
   def _item_desc(self, index, item: Item):
-    desc = f"`{index+1}` ({item.metadata_['ItemLevel']}) {localized_attr(item, 'name')}"
-    if item.metadata_["Flags"] & 0x8:
+    desc = f"`{index+1}` ({item.item_level}) {localized_attr(item, 'name')}"
+    if (item.flags or 0) & 0x8:
       desc += " (H)"
     return desc
 
@@ -30,8 +30,8 @@ class LootListEmbed(ListEmbed):
       desc += ":lock: " 
     if self._show_ids:
       desc += f"`[{loot.item.id}]` "
-    desc += f"({loot.item.metadata_['ItemLevel']}) {localized_attr(loot.item, 'name')}"
-    if loot.item.metadata_["Flags"] & 0x8:
+    desc += f"({loot.item.item_level}) {localized_attr(loot.item, 'name')}"
+    if (loot.item.flags or 0) & 0x8:
       desc += " (H)"
     datetime_to_display = loot.created_at
     desc += f" - {datetime_to_display.strftime('%d/%m/%Y')}"
@@ -0,0 +1,58 @@
+from discord import Embed
+from metrics import get_metrics_registry
+
+from pycord18n.extension import _ as _t
+
+
+class StatsEmbed(Embed):
+  MAX_FIELD_LENGTH = 1024
+  MAX_COMMANDS = 10
+
+  def __init__(self, pool_metrics: dict, settings_cache_stats: dict, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    registry = get_metrics_registry()
+    self.title = _t("settings.stats.title", minutes=int(registry.window // 60))
+
+    durations = registry.summaries("gci_command_duration_seconds", by="command")
+    queries = registry.summaries("gci_command_queries", by="command")
+    lines = list()
+    for command, summary in sorted(durations.items(), key=lambda item: -item[1]["count"])[:self.MAX_COMMANDS]:
+      lines.append("- " + _t("settings.stats.command.line", 
+        command=command, 
+        count=summary["count"], 
+        p50=self._ms(summary["p50"]), 
+        p95=self._ms(summary["p95"]),
+        queries=round(queries.get(command, {"mean": 0})["mean"], 1)))
+    self.add_field(name=_t("settings.stats.commands"), value=self._join(lines), inline=False)
+
+    lines = list()
+    for service, metric in [("Google Sheets", "gci_gsheet_call_duration_seconds"), ("Raid-Helper", "gci_raid_helper_request_duration_seconds")]:
+      summary = registry.summaries(metric).get(None)
+      if summary is not None:
+        lines.append("- " + _t("settings.stats.outbound.line", service=service, count=summary["count"], p50=self._ms(summary["p50"]), p95=self._ms(summary["p95"])))
+    self.add_field(name=_t("settings.stats.outbound.name"), value=self._join(lines), inline=False)
+
+    lines = list()
+    if len(pool_metrics) > 0:
+      lines.append("- " + _t("settings.stats.database.pool", 
+        checked_out=pool_metrics["checked_out"], 
+        size=pool_metrics["size"], 
+        overflow=pool_metrics["overflow"],
+        wait_avg=self._ms(pool_metrics.get("wait_avg", 0)),
+        wait_max=self._ms(pool_metrics.get("wait_max", 0))))
+    lines.append("- " + _t("settings.stats.database.settings_cache", hits=settings_cache_stats["hits"], misses=settings_cache_stats["misses"]))
+    self.add_field(name=_t("settings.stats.database.name"), value=self._join(lines), inline=False)
+
+  @staticmethod
+  def _ms(seconds: float):
+    return round(seconds * 1000)
+
+  def _join(self, lines):
+    if len(lines) == 0:
+      return _t("general.no_data")
+    value = ""
+    for line in lines:
+      if len(value) + len(line) + 1 > self.MAX_FIELD_LENGTH:
+        break
+      value += line + "\n"
+    return value